@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from pymongo.errors import BulkWriteError, WriteError
+
+log = logging.getLogger("review-service.batching")
+
+# Group commit for inserts. Callers queue a document and wait; the queue is
+# written with one unordered insert_many when it reaches `max_docs` documents or
+# `max_delay` seconds after its first document, whichever comes first. Each
+# caller gets its own document back with the _id the driver assigned, or the
+# error for that document only. `on_flush(docs)` runs after every write with the
+# documents that were stored, before any caller is released, so what a caller
+# does next already sees the side effects.
+
+
+class WriteBatcher:
+    def __init__(self, coll, max_docs: int = 100, max_delay: float = 0.005, on_flush=None, metrics=None, kind: str = "comment"):
+        self.coll = coll
+        self.max_docs = max_docs
+        self.max_delay = max_delay
+        self.on_flush = on_flush
+        self.metrics = metrics
+        self.kind = kind
+        self._queue = []
+        self._timer = None
+        self._writes = set()
+
+    async def insert(self, doc: dict) -> dict:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.append((doc, fut))
+        if len(self._queue) >= self.max_docs:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list):
+        started = time.perf_counter()
+        docs = [doc for doc, _ in batch]
+        errors = {}
+        try:
+            await self.coll.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                errors[err["index"]] = WriteError(err.get("errmsg", "write failed"), err.get("code"), err)
+        except Exception as e:
+            errors = {i: e for i in range(len(batch))}
+        if self.metrics is not None:
+            self.metrics.write_batch_size.observe(len(batch), self.kind)
+            self.metrics.write_batch_flush.observe(time.perf_counter() - started, self.kind)
+
+        stored = [doc for i, doc in enumerate(docs) if i not in errors]
+        if stored and self.on_flush is not None:
+            try:
+                await self.on_flush(stored)
+            except Exception:
+                log.exception("post-flush hook failed for %d %s documents", len(stored), self.kind)
+        for i, (doc, fut) in enumerate(batch):
+            if fut.done():
+                continue  # the caller went away; the document is stored regardless
+            if i in errors:
+                fut.set_exception(errors[i])
+            else:
+                fut.set_result(doc)
+
+    async def aclose(self):
+        """Writes whatever is queued and waits for writes in flight."""
+        self._flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
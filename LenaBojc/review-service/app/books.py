@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+import httpx
+
+
+class BookServiceError(Exception):
+    """book-service answered with something other than 200 or 404."""
+
+
+class BookServiceUnavailable(Exception):
+    """book-service could not be reached."""
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def set(self, key, value, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _genres(resp: httpx.Response) -> tuple:
+    try:
+        genres = (resp.json().get("book") or {}).get("genres")
+    except (ValueError, AttributeError):
+        return ()
+    return tuple(g for g in genres if isinstance(g, str)) if isinstance(genres, list) else ()
+
+
+class BookClient:
+    """App-lifetime pooled client for book-service with a cache of book existence.
+
+    Existing books are cached (with their genres) for `ttl` seconds, missing
+    books (404) for the shorter `negative_ttl`. Upstream errors are never cached. Concurrent lookups
+    of the same uncached book share one outbound request.
+    """
+
+    def __init__(self, base_url: str, ttl: float = 300.0, negative_ttl: float = 30.0, maxsize: int = 10_000, event_hooks: Optional[dict] = None):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self._inflight = {}
+        self.http = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+            event_hooks=event_hooks,
+        )
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def exists(self, book_id: str) -> bool:
+        return await self._lookup(book_id) is not None
+
+    async def genres(self, book_id: str) -> Optional[list]:
+        """The book's genres, or None when the book does not exist."""
+        found = await self._lookup(book_id)
+        return None if found is None else list(found)
+
+    def cached_genres(self, book_id: str) -> Optional[list]:
+        """Genres of a book already in the cache; never calls book-service."""
+        entry = self.cache.get(book_id)
+        return None if entry is None or entry[1] is None else list(entry[1])
+
+    async def _lookup(self, book_id: str) -> Optional[tuple]:
+        # cached value: a tuple of genres for an existing book, None for a missing one
+        entry = self.cache.get(book_id)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+
+        pending = self._inflight.get(book_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(book_id))
+            self._inflight[book_id] = pending
+            pending.add_done_callback(lambda f: self._done(book_id, f))
+        return await asyncio.shield(pending)
+
+    def _done(self, book_id: str, fut: asyncio.Future):
+        self._inflight.pop(book_id, None)
+        if not fut.cancelled():
+            fut.exception()  # retrieved here so abandoned lookups do not log warnings
+
+    async def _fetch(self, book_id: str) -> Optional[tuple]:
+        try:
+            resp = await self.http.get(f"{self.base_url}/books/{book_id}")
+        except Exception as e:
+            raise BookServiceUnavailable(str(e)) from e
+
+        if resp.status_code == 200:
+            found = _genres(resp)
+            self.cache.set(book_id, found, self.ttl)
+            return found
+        if resp.status_code == 404:
+            self.cache.set(book_id, None, self.negative_ttl)
+            return None
+        raise BookServiceError(f"book-service returned {resp.status_code}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
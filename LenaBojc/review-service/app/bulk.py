@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timezone
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from .books import BookServiceError, BookServiceUnavailable
+from .models import NewCommentIn, NewReviewIn
+from .ratings import RATING_TYPE, rating_batch_ops
+from .trends import TREND_TYPE, trend_batch_ops
+
+# Streaming NDJSON import of reviews and comments. Lines are validated and
+# written chunk by chunk; one result line is emitted per input line, in order.
+#
+# The request body is spooled (spool_body()) before the response starts: once a
+# StreamingResponse runs, Starlette listens for the client disconnecting on the
+# same receive channel and would consume the body the import is still reading.
+
+log = logging.getLogger("review-service.bulk")
+
+DUPLICATE_KEY = 11000
+
+
+async def spool_body(request, max_memory: int = 1024 * 1024):
+    """The whole request body in a temporary file; past `max_memory` bytes it moves to disk."""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def spooled_chunks(spool, size: int = 64 * 1024):
+    while True:
+        chunk = spool.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def ndjson_lines(chunks, max_line_bytes: int):
+    """Splits a byte stream into `(lineNo, bytes | None)`; None marks an oversized line."""
+    buf, line_no, oversized = b"", 0, False
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            nl = buf.find(b"\n")
+            if nl < 0:
+                break
+            line, buf = buf[:nl], buf[nl + 1:]
+            line_no += 1
+            yield line_no, None if oversized or len(line) > max_line_bytes else line
+            oversized = False
+        if len(buf) > max_line_bytes:
+            buf, oversized = b"", True
+    if buf or oversized:
+        yield line_no + 1, None if oversized else buf
+
+
+def _error(line_no: int, status: int, message: str, errors=None) -> dict:
+    out = {"line": line_no, "status": status, "message": message}
+    if errors:
+        out["errors"] = errors
+    return out
+
+
+def _created_at(value):
+    """The line's own `createdAt` (ISO 8601, UTC when no offset is given); raises ValueError."""
+    if not isinstance(value, str):
+        raise ValueError("not a string")
+    created_at = datetime.fromisoformat(value)
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+
+def _parse(line_no: int, raw: bytes):
+    """Returns `(kind, model, createdAt | None)` or an error result."""
+    if raw is None:
+        return _error(line_no, 400, "Bad request", [{"loc": ["line"], "msg": "line too long", "type": "value_error"}])
+    try:
+        obj = json.loads(raw)
+        if not isinstance(obj, dict):
+            raise ValueError("not an object")
+    except ValueError:
+        return _error(line_no, 400, "Bad request", [{"loc": ["line"], "msg": "invalid JSON object", "type": "value_error"}])
+
+    kind = obj.pop("type", None) or ("comment" if "comment" in obj else "review")
+    model = {"review": NewReviewIn, "comment": NewCommentIn}.get(kind) if isinstance(kind, str) else None
+    if model is None:
+        return _error(line_no, 400, "Bad request", [{"loc": ["type"], "msg": "type must be 'review' or 'comment'", "type": "value_error"}])
+    created_at = None
+    if obj.get("createdAt") is not None:
+        try:
+            created_at = _created_at(obj.pop("createdAt"))
+        except ValueError:
+            return _error(line_no, 400, "Bad request", [{"loc": ["createdAt"], "msg": "invalid ISO 8601 datetime", "type": "value_error"}])
+    obj.pop("createdAt", None)
+    try:
+        return kind, model.model_validate(obj), created_at
+    except ValidationError as e:
+        return _error(line_no, 400, "Bad request", json.loads(e.json(include_url=False)))
+
+
+async def _check_books(books, book_ids, concurrency: int = 20) -> dict:
+    """Maps each distinct bookId to None when it exists, else to an error (status, message).
+
+    At most `concurrency` lookups run at once, so a chunk with many distinct
+    books queues behind the client's connection pool instead of timing out in it.
+    """
+    ids = list(book_ids)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def exists(book_id):
+        async with sem:
+            return await books.exists(book_id)
+
+    found = await asyncio.gather(*(exists(b) for b in ids), return_exceptions=True)
+    out = {}
+    for book_id, res in zip(ids, found):
+        if res is True:
+            out[book_id] = None
+        elif res is False:
+            out[book_id] = (404, f"Book with id='{book_id}' not found")
+        elif isinstance(res, BookServiceUnavailable):
+            out[book_id] = (500, "Error connecting to book-service")
+        elif isinstance(res, BookServiceError):
+            out[book_id] = (500, "Error checking book existence in book-service")
+        else:
+            log.error("book lookup for %s failed", book_id, exc_info=res)
+            out[book_id] = (500, "Error checking book existence in book-service")
+    return out
+
+
+async def _write_chunk(storage, books, chunk, book_concurrency: int = 20) -> list:
+    results = {}
+    pending = []
+    for line_no, parsed in chunk:
+        if isinstance(parsed, dict):
+            results[line_no] = parsed
+        else:
+            pending.append((line_no, *parsed))
+
+    book_errors = await _check_books(books, {m.bookId for _, _, m, _ in pending}, book_concurrency)
+    docs, lines = [], []
+    for line_no, kind, m, created_at in pending:
+        err = book_errors[m.bookId]
+        if err:
+            results[line_no] = _error(line_no, *err)
+            continue
+        doc = m.model_dump()
+        # historical imports keep their own dates; the rest are stamped row by row
+        doc.update({"_id": ObjectId(), "type": kind, "createdAt": created_at or datetime.now(timezone.utc)})
+        docs.append(doc)
+        lines.append(line_no)
+
+    # one insert_many per collection; with the shared layout that is all of them
+    groups = {}
+    for i, doc in enumerate(docs):
+        coll = storage.coll(doc["type"])
+        groups.setdefault(coll.name, (coll, []))[1].append(i)
+    failed = {}
+    for coll, indexes in groups.values():
+        try:
+            await coll.insert_many([docs[i] for i in indexes], ordered=False)
+        except BulkWriteError as e:
+            failed.update({indexes[w["index"]]: w for w in e.details.get("writeErrors", [])})
+        except Exception:
+            failed.update({i: {} for i in indexes})
+
+    added, touched, rated = defaultdict(list), set(), []
+    for i, (line_no, doc) in enumerate(zip(lines, docs)):
+        w = failed.get(i)
+        if w is None:
+            results[line_no] = {"line": line_no, "status": 201, "id": str(doc["_id"]), "type": doc["type"]}
+            touched.add(doc["bookId"])
+            if doc["type"] == "review":
+                added[doc["bookId"]].append(doc["rating"])
+                rated.append((doc["bookId"], doc["rating"], doc["createdAt"]))
+        elif w.get("code") == DUPLICATE_KEY:
+            results[line_no] = _error(line_no, 409, "Review already exists for this user and book")
+        else:
+            results[line_no] = _error(line_no, 500, f"Internal server error while creating {doc['type']}")
+
+    if touched:
+        try:
+            await storage.bulk_write({
+                RATING_TYPE: rating_batch_ops(added, {b: books.cached_genres(b) for b in added}, touched),
+                TREND_TYPE: trend_batch_ops(rated),
+            })
+        except Exception:
+            log.exception("failed to update rating aggregates for imported reviews")
+    return [results[line_no] for line_no, _ in chunk]
+
+
+async def import_ndjson(storage, books, chunks, chunk_size: int = 1000, max_line_bytes: int = 64 * 1024, book_concurrency: int = 20):
+    """Yields one NDJSON result line per input line, then a summary line."""
+    created = failed = 0
+    chunk = []
+
+    async def flush():
+        nonlocal created, failed
+        out = await _write_chunk(storage, books, chunk, book_concurrency)
+        chunk.clear()
+        for r in out:
+            if r["status"] == 201:
+                created += 1
+            else:
+                failed += 1
+        return b"".join(json.dumps(r).encode() + b"\n" for r in out)
+
+    async for line_no, raw in ndjson_lines(chunks, max_line_bytes):
+        if raw is not None and not raw.strip():
+            continue
+        chunk.append((line_no, _parse(line_no, raw)))
+        if len(chunk) >= chunk_size:
+            yield await flush()
+    if chunk:
+        yield await flush()
+    yield json.dumps({"summary": {"created": created, "failed": failed}}).encode() + b"\n"
@@ -0,0 +1,163 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+from pymongo import UpdateOne
+from .ratings import RATING_TYPE
+
+log = logging.getLogger("review-service.cache")
+
+# Response cache for the book listings. Entries are the encoded response bodies,
+# keyed by route, bookId, the book's generation and the query parameters.
+#
+# The generation is a counter (`gen`) on the book's bookRating document in Mongo.
+# Every write that changes what a listing returns bumps it after the write
+# itself, so readers that see the new generation also see the write, and keys
+# of older generations are simply never asked for again. Because the counter
+# lives in Mongo, invalidation holds across uvicorn workers and replicas, with
+# either a per-process memory cache or a shared Redis. Entries also expire after
+# a TTL, which bounds staleness if a generation bump is ever lost.
+#
+# Reading the generation is itself a Mongo round trip, so each process keeps the
+# generations it read for a short while (Generations below). Writes made by this
+# process drop their book's entry right away; a write through another worker or
+# replica becomes visible here after at most that short TTL.
+
+
+class MemoryCache:
+    """In-process LRU of bytes, bounded by the total size of the stored values."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._data)))
+
+    def _drop(self, key: str):
+        _, value = self._data.pop(key)
+        self.size -= len(value)
+
+    async def aclose(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "hits": self.hits, "misses": self.misses, "entries": len(self._data), "bytes": self.size}
+
+
+class RedisCache:
+    """Shared cache on any server speaking the Redis protocol.
+
+    Requires the `redis` package. Errors are logged and treated as misses, so an
+    unavailable cache only costs the Mongo query it was meant to save.
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "reviews:"):
+        import redis.asyncio as redis
+
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = await self.client.get(self.prefix + key)
+        except Exception:
+            log.warning("cache get failed", exc_info=True)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes):
+        try:
+            await self.client.set(self.prefix + key, value, ex=self.ttl)
+        except Exception:
+            log.warning("cache set failed", exc_info=True)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+def make_cache(url: str, max_bytes: int, ttl: float):
+    """Redis when `url` is set (redis://, rediss://, unix://), else in-process memory."""
+    if url:
+        try:
+            return RedisCache(url, ttl)
+        except ImportError as e:
+            raise RuntimeError("CACHE_URL is set but the redis package is not installed (pip install redis)") from e
+    return MemoryCache(max_bytes, ttl)
+
+
+class Generations:
+    """Per-process cache of book generations, each read from Mongo at most once per `ttl`."""
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    async def get(self, coll, book_id: str) -> int:
+        entry = self._data.get(book_id)
+        if entry is not None and entry[0] >= time.monotonic():
+            return entry[1]
+        gen = await generation(coll, book_id)
+        if self.ttl > 0:
+            self._data.pop(book_id, None)
+            self._data[book_id] = (time.monotonic() + self.ttl, gen)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return gen
+
+    def forget(self, *book_ids):
+        for book_id in book_ids:
+            self._data.pop(book_id, None)
+
+
+def cache_key(route: str, book_id: str, gen: int, *params) -> str:
+    return "|".join([route, book_id, str(gen), *("" if p is None else str(p) for p in params)])
+
+
+async def generation(coll, book_id: str) -> int:
+    doc = await coll.find_one({"type": RATING_TYPE, "bookId": book_id}, {"gen": 1})
+    return (doc or {}).get("gen", 0)
+
+
+async def bump_generation(coll, book_id: str):
+    await coll.update_one({"type": RATING_TYPE, "bookId": book_id}, {"$inc": {"gen": 1}}, upsert=True)
+
+
+async def bump_generations(coll, book_ids):
+    ops = [UpdateOne({"type": RATING_TYPE, "bookId": b}, {"$inc": {"gen": 1}}, upsert=True) for b in dict.fromkeys(book_ids)]
+    if ops:
+        await coll.bulk_write(ops, ordered=False)
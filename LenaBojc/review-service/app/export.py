@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import logging
+
+log = logging.getLogger("review-service.export")
+
+# Streams reviews or comments straight from a server-side cursor. Memory use is
+# bounded by one cursor batch regardless of how many documents match.
+
+FIELDS = {
+    "review": ["id", "userId", "bookId", "rating", "review", "createdAt"],
+    "comment": ["id", "userId", "bookId", "comment", "createdAt"],
+}
+
+
+def export_query(kind: str, bookId=None, userId=None, createdFrom=None, createdTo=None) -> dict:
+    query = {"type": kind}
+    if bookId:
+        query["bookId"] = bookId
+    if userId:
+        query["userId"] = userId
+    if createdFrom or createdTo:
+        query["createdAt"] = {}
+        if createdFrom:
+            query["createdAt"]["$gte"] = createdFrom
+        if createdTo:
+            query["createdAt"]["$lt"] = createdTo
+    return query
+
+
+def _row(doc: dict, fields) -> dict:
+    row = {f: doc.get(f) for f in fields if f != "id"}
+    row["id"] = str(doc["_id"])
+    if row.get("createdAt") is not None:
+        row["createdAt"] = row["createdAt"].isoformat()
+    return {f: row.get(f) for f in fields}
+
+
+async def export_rows(coll, query: dict, kind: str, fmt: str, batch_size: int):
+    fields = FIELDS[kind]
+    projection = {f: 1 for f in fields if f != "id"}
+    cursor = coll.find(query, projection).batch_size(batch_size)
+
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore") if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+
+    pending = 0
+    try:
+        async for doc in cursor:
+            row = _row(doc, fields)
+            if writer:
+                writer.writerow(row)
+            else:
+                buf.write(json.dumps(row, ensure_ascii=False))
+                buf.write("\n")
+            pending += 1
+            if pending >= batch_size:
+                yield buf.getvalue().encode()
+                buf.seek(0)
+                buf.truncate()
+                pending = 0
+    except Exception:
+        # the status line is already sent; re-raising makes the server abort the
+        # chunked transfer instead of ending it cleanly, so clients see a
+        # truncated export as an error rather than as a complete one
+        log.exception("export of %s aborted", kind)
+        raise
+    finally:
+        await cursor.close()
+    if buf.tell():
+        yield buf.getvalue().encode()
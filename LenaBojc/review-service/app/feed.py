@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+from .serialization import COMMENT_PROJECTION, REVIEW_PROJECTION, comment_dict, review_dict
+
+log = logging.getLogger("review-service.feed")
+
+# "Latest activity" across all books, served from memory. The feed holds the
+# newest `size` reviews and comments, newest first. It is warmed from Mongo at
+# startup and then kept current by the write handlers.
+#
+# Each worker has its own feed. With several workers or replicas, set
+# RECENT_FEED_CAPPED=1: handlers then publish feed events to a capped collection
+# and every worker applies them from a tailable cursor, its own included.
+
+KINDS = ("review", "comment")
+# how long one getMore on the tailing cursor waits for new events
+TAIL_AWAIT_MS = 1000
+
+
+def feed_item(doc: dict) -> dict:
+    if doc.get("type", "review") == "comment":
+        return {"type": "comment", **comment_dict(doc)}
+    return {"type": "review", **review_dict(doc, exclude_none=True)}
+
+
+def _newer(a: dict, b: dict) -> bool:
+    return (a["createdAt"], a["id"]) > (b["createdAt"], b["id"])
+
+
+class RecentFeed:
+    """Bounded, newest-first buffer of feed items keyed by id."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.items = []
+        self._encoded = {}
+
+    def add(self, item: dict):
+        """Adds an item, or replaces the one with the same id in place."""
+        for i, existing in enumerate(self.items):
+            if existing["id"] == item["id"]:
+                self.items[i] = item
+                break
+        else:
+            pos = 0
+            while pos < len(self.items) and _newer(self.items[pos], item):
+                pos += 1
+            if pos >= self.size:
+                return
+            self.items.insert(pos, item)
+            del self.items[self.size:]
+        self._encoded.clear()
+
+    def update(self, item: dict):
+        """Replaces an item that is in the feed; items that already fell out stay out."""
+        if any(existing["id"] == item["id"] for existing in self.items):
+            self.add(item)
+
+    def remove(self, item_id: str):
+        kept = [it for it in self.items if it["id"] != item_id]
+        if len(kept) != len(self.items):
+            self.items = kept
+            self._encoded.clear()
+
+    def latest(self, limit: int, kind: str = None) -> list:
+        items = self.items if kind is None else [it for it in self.items if it["type"] == kind]
+        return items[:limit]
+
+    def memo(self, key, build):
+        """`build()` once per key until the feed changes; polling clients share the result."""
+        if key not in self._encoded:
+            self._encoded[key] = build()
+        return self._encoded[key]
+
+    async def warm(self, storage):
+        # newest of each kind; add() keeps the merged feed ordered and bounded
+        projection = {**REVIEW_PROJECTION, **COMMENT_PROJECTION, "type": 1}
+        for kind in KINDS:
+            cursor = storage.coll(kind).find({"type": kind}, projection).sort([("createdAt", -1), ("_id", -1)]).limit(self.size)
+            for doc in await cursor.to_list(length=self.size):
+                self.add(feed_item(doc))
+
+
+class FeedPublisher:
+    """Applies feed events locally, or publishes them to the capped collection."""
+
+    def __init__(self, feed: RecentFeed, events=None):
+        self.feed = feed
+        self.events = events
+
+    async def added(self, doc: dict):
+        await self._publish({"op": "add", "item": feed_item(doc)})
+
+    async def added_many(self, docs: list):
+        """added() for several documents, published with one write."""
+        await self._publish_many([{"op": "add", "item": feed_item(d)} for d in docs])
+
+    async def updated(self, doc: dict):
+        await self._publish({"op": "update", "item": feed_item(doc)})
+
+    async def removed(self, item_id: str):
+        await self._publish({"op": "remove", "id": item_id})
+
+    async def _publish(self, event: dict):
+        if self.events is None:
+            apply_event(self.feed, event)
+            return
+        try:
+            await self.events.insert_one({**event, "ts": datetime.now(timezone.utc)})
+        except Exception:
+            # the write itself succeeded; this worker at least shows it
+            log.exception("failed to publish feed event")
+            apply_event(self.feed, event)
+
+    async def _publish_many(self, events: list):
+        if not events:
+            return
+        if self.events is None:
+            for event in events:
+                apply_event(self.feed, event)
+            return
+        ts = datetime.now(timezone.utc)
+        try:
+            await self.events.insert_many([{**e, "ts": ts} for e in events])
+        except Exception:
+            log.exception("failed to publish %d feed events", len(events))
+            for event in events:
+                apply_event(self.feed, event)
+
+
+def apply_event(feed: RecentFeed, event: dict):
+    if event["op"] == "add":
+        feed.add(event["item"])
+    elif event["op"] == "update":
+        feed.update(event["item"])
+    elif event["op"] == "remove":
+        feed.remove(event["id"])
+
+
+async def ensure_capped(db, name: str, size_bytes: int, max_docs: int):
+    try:
+        await db.create_collection(name, capped=True, size=size_bytes, max=max_docs)
+    except CollectionInvalid:
+        pass
+    return db[name]
+
+
+async def tail_events(events, feed: RecentFeed, since: datetime):
+    """Applies every event published at or after `since`, forever.
+
+    Replaying events the feed already reflects is harmless: applied in order,
+    the last event for an id always decides its state.
+    """
+    while True:
+        try:
+            # with max_await_time_ms every getMore carries maxTimeMS, which is how
+            # the slow query log tells these deliberate waits from slow reads
+            cursor = events.find({"ts": {"$gte": since}}, cursor_type=CursorType.TAILABLE_AWAIT).max_await_time_ms(TAIL_AWAIT_MS)
+            while cursor.alive:
+                async for event in cursor:
+                    since = event["ts"]
+                    apply_event(feed, event)
+                # a tailable cursor on an empty result ends right away
+                await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("feed tailing failed, retrying")
+            await asyncio.sleep(5)
@@ -0,0 +1,40 @@
+from contextvars import ContextVar
+from pymongo import monitoring
+
+# Counts the Mongo commands each request sends. The middleware in main.py puts a
+# fresh list into `mongo_commands` per request; Motor runs pymongo calls with a
+# copy of the caller's context, so the listener appends to that same list.
+
+mongo_commands = ContextVar("mongo_commands", default=None)
+
+
+class CommandCounter(monitoring.CommandListener):
+    def started(self, event):
+        commands = mongo_commands.get()
+        if commands is not None:
+            commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class RoundTripStats:
+    """Per-endpoint totals of Mongo round trips."""
+
+    def __init__(self):
+        self.routes = {}
+
+    def record(self, route: str, round_trips: int):
+        stats = self.routes.setdefault(route, {"requests": 0, "roundTrips": 0, "max": 0})
+        stats["requests"] += 1
+        stats["roundTrips"] += round_trips
+        stats["max"] = max(stats["max"], round_trips)
+
+    def snapshot(self) -> dict:
+        return {
+            route: {**s, "avg": round(s["roundTrips"] / s["requests"], 2)}
+            for route, s in sorted(self.routes.items())
+        }
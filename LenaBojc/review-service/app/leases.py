@@ -0,0 +1,27 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+
+# Single-holder leases for periodic jobs that every worker schedules but only one
+# should run. A lease is one document {_id: name, holder, expiresAt}; taking it
+# succeeds when it is free, expired or already ours. The holder renews it on
+# every run, so it keeps the job until it stops; then another worker takes over
+# once the lease expires.
+
+HOLDER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def acquire(coll, name: str, ttl: float, holder: str = HOLDER) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        await coll.update_one(
+            {"_id": name, "$or": [{"expiresAt": {"$lte": now}}, {"holder": holder}]},
+            {"$set": {"holder": holder, "expiresAt": now + timedelta(seconds=ttl)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # someone else holds it: the filter did not match and the upsert hit their _id
+        return False
+    return True
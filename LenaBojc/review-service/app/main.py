@@ -1,17 +1,40 @@
 import os
-import httpx
+import asyncio
+import logging
+import time
 from dotenv import load_dotenv
-from datetime import datetime, timezone
-from fastapi import FastAPI, HTTPException, Request, status
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, HTTPException, Query, Request, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pymongo.errors import DuplicateKeyError
 from pymongo import ReturnDocument
 from pydantic import BaseModel
+from typing import Literal, Optional
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
-from .models import AverageScore, AverageScoreData, CommentDeleteIn, NewReviewIn, RetrieveReviewIn, ReviewCreated, ReviewOut, Msg, NewCommentIn, CommentOut, CommentCreated, ReviewTextIn, ReviewUpdated, ReviewTextIn, RatingIn, ReviewFetched, ReviewsList, ReviewsListData, CommentsList, CommentsListData
+from .batching import WriteBatcher
+from .bulk import import_ndjson, spool_body, spooled_chunks
+from .export import export_query, export_rows
+from .cache import Generations, bump_generation, bump_generations, cache_key, make_cache
+from .books import BookClient, BookServiceError, BookServiceUnavailable
+from .feed import FeedPublisher, RecentFeed, ensure_capped, tail_events
+from .indexes import reconcile_layout, unique_indexes_ready
+from .leases import acquire as acquire_lease
+from .instrumentation import CommandCounter, RoundTripStats, mongo_commands
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics
+from .openapi import install as install_openapi
+from .slowqueries import SlowQueryLog
+from .pagination import fetch_page, page_pipeline, split_page
+from .ratings import PRIOR_MEAN, PRIOR_WEIGHT, RATING_TYPE, average_of, rating_update, rebuild_ratings, summary_of
+from .search import search_query, search_terms, snippet
+from .singleflight import SingleFlight
+from .storage import STORAGE_LAYOUT, Storage
+from .trends import TREND_TYPE, rebuild_trends, trend_point, trend_updates
+from .serialization import COMMENT_FIELDS, COMMENT_PROJECTION, REVIEW_FIELDS, REVIEW_PROJECTION, comment_dict, encode, fields_projection, parse_fields, respond, respond_encoded, review_dict, sparse_dict
+from .models import AverageScore, Averages, AveragesIn, CommentDeleteIn, NewReviewIn, ReviewCreated, ReviewLookup, ReviewLookupIn, ReviewOut, Msg, NewCommentIn, CommentOut, CommentCreated, ReviewTextIn, ReviewUpdated, ReviewTextIn, RatingIn, ReviewFetched, ReviewsList, CommentsList, Discussion, RatingSummary, RatingTrend, Recent, SearchResults, TopBooks, IndexReport, IndexReportOut, BookCacheStats, BookCacheStatsOut, ResponseCacheStats, ResponseCacheStatsOut, RoundTripStatsOut, SlowQueries, SingleFlightStatsOut
 
 load_dotenv()
 MONGO_URL = os.getenv("MONGO_URL")
@@ -22,8 +45,30 @@ COLL = os.getenv("COLLECTION_NAME")
 # COLL = "reviews"
 
 BOOKS_API_URL = os.getenv("BOOKS_API_URL")
+BOOK_CACHE_TTL = float(os.getenv("BOOK_CACHE_TTL", "300"))
+BOOK_CACHE_NEGATIVE_TTL = float(os.getenv("BOOK_CACHE_NEGATIVE_TTL", "30"))
+BOOK_CACHE_SIZE = int(os.getenv("BOOK_CACHE_SIZE", "10000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+# concurrent book-service lookups per import chunk; keep it within the client's pool
+BULK_BOOK_LOOKUPS = int(os.getenv("BULK_BOOK_LOOKUPS", "20"))
+RATING_REBUILD_INTERVAL = float(os.getenv("RATING_REBUILD_INTERVAL", "3600"))
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_GENERATION_TTL = float(os.getenv("CACHE_GENERATION_TTL", "1"))
+RECENT_FEED_SIZE = int(os.getenv("RECENT_FEED_SIZE", "500"))
+RECENT_FEED_CAPPED = os.getenv("RECENT_FEED_CAPPED", "0") == "1"
+RECENT_FEED_CAPPED_BYTES = int(os.getenv("RECENT_FEED_CAPPED_BYTES", str(16 * 1024 * 1024)))
+# group commit for comment creation, see batching.py
+COMMENT_BATCHING = os.getenv("COMMENT_BATCHING", "0") == "1"
+COMMENT_BATCH_SIZE = int(os.getenv("COMMENT_BATCH_SIZE", "100"))
+COMMENT_BATCH_DELAY_MS = float(os.getenv("COMMENT_BATCH_DELAY_MS", "5"))
 
-app = FastAPI(title="Reviews Service", version="1.0")
+log = logging.getLogger("review-service")
+
+app = FastAPI(title="Reviews Service", version="1.0", openapi_url=None)
+# /openapi.json, /docs and /redoc serve the build-time schema snapshot, see openapi.py
+install_openapi(app)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -31,19 +76,128 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.round_trips = RoundTripStats()
+app.single_flight = SingleFlight()
+app.metrics = Metrics()
+app.slow_queries = SlowQueryLog()
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    app.metrics.requests.observe(
+        time.perf_counter() - started,
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code),
+    )
+    return response
+
+@app.middleware("http")
+async def count_mongo_round_trips(request: Request, call_next):
+    commands = []
+    token = mongo_commands.set(commands)
+    try:
+        response = await call_next(request)
+    finally:
+        mongo_commands.reset(token)
+    route = request.scope.get("route")
+    if route is not None:
+        app.round_trips.record(route.name, len(commands))
+    response.headers["X-Mongo-Round-Trips"] = str(len(commands))
+    return response
+
 # ----- Startup/Shutdown -----
 
 @app.on_event("startup")
 async def startup():
-    app.mongodb_client = AsyncIOMotorClient(MONGO_URL)
+    app.mongodb_client = AsyncIOMotorClient(MONGO_URL, event_listeners=[CommandCounter(), app.metrics.mongo, app.slow_queries])
+    app.slow_queries.attach(asyncio.get_running_loop(), app.mongodb_client)
     app.db = app.mongodb_client[DB_NAME]
-    # await app.db[COLL].create_index([("bookId", 1)])
-    # await app.db[COLL].create_index([("createdAt", -1)])
+    app.storage = Storage(app.db, COLL, STORAGE_LAYOUT)
+    app.books = BookClient(
+        BOOKS_API_URL, ttl=BOOK_CACHE_TTL, negative_ttl=BOOK_CACHE_NEGATIVE_TTL, maxsize=BOOK_CACHE_SIZE,
+        event_hooks=app.metrics.http_hooks({BOOKS_API_URL: "books"}),
+    )
+    app.cache = make_cache(CACHE_URL, CACHE_MAX_BYTES, CACHE_TTL)
+    app.generations = Generations(CACHE_GENERATION_TTL)
+    app.feed = RecentFeed(RECENT_FEED_SIZE)
+    app.feed_events = FeedPublisher(app.feed)
+    app.comment_batcher = WriteBatcher(
+        app.storage.coll("comment"), max_docs=COMMENT_BATCH_SIZE, max_delay=COMMENT_BATCH_DELAY_MS / 1000,
+        on_flush=_comments_flushed, metrics=app.metrics, kind="comment",
+    ) if COMMENT_BATCHING else None
+    app.index_report = {"status": "pending"}
+    app.unique_indexes_ready = False
+    # reconciled in the background so index builds never hold up readiness
+    app.index_task = asyncio.create_task(_reconcile_indexes())
+    app.rating_task = asyncio.create_task(_rebuild_ratings_periodically()) if RATING_REBUILD_INTERVAL > 0 else None
+    app.feed_task = asyncio.create_task(_run_feed())
+    app.loop_lag_task = asyncio.create_task(app.metrics.watch_loop_lag())
 
 @app.on_event("shutdown")
 async def shutdown():
+    app.index_task.cancel()
+    if app.rating_task:
+        app.rating_task.cancel()
+    app.feed_task.cancel()
+    app.loop_lag_task.cancel()
+    if app.comment_batcher:
+        await app.comment_batcher.aclose()
+    await app.books.aclose()
+    await app.cache.aclose()
     app.mongodb_client.close()
 
+async def _reconcile_indexes():
+    try:
+        report = await reconcile_layout(app.db, app.storage.collection_names())
+        app.index_report = {"status": "done", **report}
+        app.unique_indexes_ready = unique_indexes_ready(report)
+    except Exception as e:
+        app.index_report = {"status": "failed", "error": str(e)}
+
+async def _run_feed():
+    since = datetime.now(timezone.utc) - timedelta(minutes=1)
+    if RECENT_FEED_CAPPED:
+        try:
+            app.feed_events.events = await ensure_capped(app.db, f"{COLL}_recent", RECENT_FEED_CAPPED_BYTES, RECENT_FEED_SIZE * 4)
+        except Exception:
+            log.exception("capped feed collection unavailable, feed stays local to this worker")
+    try:
+        await app.feed.warm(app.storage)
+    except Exception:
+        log.exception("failed to warm the recent activity feed")
+    if app.feed_events.events is not None:
+        await tail_events(app.feed_events.events, app.feed, since)
+
+async def _comments_flushed(docs: list):
+    # one generation bump per book for the whole batch
+    try:
+        await bump_generations(app.storage.coll(RATING_TYPE), [d["bookId"] for d in docs])
+    except Exception:
+        log.exception("failed to bump cache generations after a comment batch")
+    app.generations.forget(*(d["bookId"] for d in docs))
+    # one feed write for the whole batch too
+    await app.feed_events.added_many(docs)
+
+async def _rebuild_ratings_periodically():
+    # incremental updates keep the aggregates current; this only corrects drift
+    # left by writes whose aggregate update failed. Every worker schedules it,
+    # the holder of the lease runs it; the lease outlives one interval so the
+    # holder keeps it across runs. The first run is at startup, so drift left by
+    # a previous deployment is corrected without waiting a whole interval.
+    while True:
+        try:
+            if await acquire_lease(app.db[f"{COLL}_leases"], "ratingRebuild", RATING_REBUILD_INTERVAL * 1.5):
+                result = await rebuild_ratings(app.storage.coll("review"), app.storage.coll(RATING_TYPE), app.books)
+                log.info("rebuilt %s book ratings, zeroed %s, skipped %s", result["books"], result["zeroed"], result["skipped"])
+                result = await rebuild_trends(app.storage.coll("review"), app.storage.coll(TREND_TYPE))
+                log.info("rebuilt %s rating trend periods, zeroed %s, skipped %s", result["periods"], result["zeroed"], result["skipped"])
+        except Exception:
+            log.exception("periodic rating rebuild failed")
+        await asyncio.sleep(RATING_REBUILD_INTERVAL)
+
 # ----- POST -----
 @app.post("/reviews",
         description="Creates a new review for a specific book and user. It checks if a review by that user for the book already exists, and if not, saves the new review with a timestamp to the database. It returns a success message with the review details, or an error if the review already exists or if saving fails.",
@@ -77,51 +231,41 @@ async def shutdown():
         name="newReview",
 )
 async def new_review(payload: NewReviewIn):
-    existing = await app.db[COLL].find_one({
-        "userId": payload.userId,
-        "bookId": payload.bookId
-    })
-    if existing:
-        return JSONResponse(status_code=409, content={"message": "Review already exists for this user and book"})
-
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(f"{BOOKS_API_URL}/books/{payload.bookId}")
-            if resp.status_code == 404:
-                return JSONResponse(
-                    status_code=404,
-                    content={"message": f"Book with id='{payload.bookId}' not found"},
-                )
-            elif resp.status_code != 200:
-                return JSONResponse(
-                    status_code=500,
-                    content={"message": "Error checking book existence in book-service"},
-                )
-        except Exception:
-            return JSONResponse(
-                status_code=500,
-                content={"message": "Error connecting to book-service"},
-            )
+    error = await check_book(payload.bookId)
+    if error:
+        return error
 
     doc = payload.model_dump()
-    doc["createdAt"] = datetime.now(timezone.utc)
+    doc["createdAt"] = utcnow()
     doc["type"] = "review"
 
+    # duplicates are rejected by the unique (type, userId, bookId) index; until the
+    # reconciler has confirmed it is built, they are also looked for first
+    if not app.unique_indexes_ready:
+        try:
+            existing = await app.storage.coll("review").find_one({"type": "review", "userId": payload.userId, "bookId": payload.bookId}, {"_id": 1})
+        except Exception:
+            return JSONResponse(status_code=500, content={"message": "Internal server error while creating review"})
+        if existing:
+            return JSONResponse(status_code=409, content={"message": "Review already exists for this user and book"})
     try:
-        res = await app.db[COLL].insert_one(doc)
+        await app.storage.coll("review").insert_one(doc)
+    except DuplicateKeyError:
+        return JSONResponse(status_code=409, content={"message": "Review already exists for this user and book"})
     except Exception:
         return JSONResponse(status_code=500, content={"message": "Internal server error while creating review"})
 
-    created = await app.db[COLL].find_one({"_id": res.inserted_id})
+    await update_rating_aggregate(payload.bookId, add=payload.rating, genres=app.books.cached_genres(payload.bookId), created_at=doc["createdAt"])
+    await app.feed_events.added(doc)
+
     return {
         "message": "Review created successfully",
-        "data": to_out(created).model_dump()
+        "data": to_out(doc).model_dump()
     }
 
 @app.post(
     "/comments",
-    description="Creates a new comment for a specific book and user. It receives the comment data, adds a creation timestamp, saves the comment to the database, and returns a confirmation message with the saved comment details. If an error occurs during saving, it returns an error message.",
+    description="Creates a new comment for a specific book and user. It receives the comment data, adds a creation timestamp, saves the comment to the database, and returns a confirmation message with the saved comment details. If an error occurs during saving, it returns an error message. With COMMENT_BATCHING=1, concurrent comments are written together in one insert every few milliseconds.",
     summary="New comment from user for a book",
     tags=["Reviews"],
     response_model=CommentCreated,
@@ -151,20 +295,244 @@ async def new_review(payload: NewReviewIn):
 )
 async def new_comment(payload: NewCommentIn):
     doc = payload.model_dump()
-    doc["createdAt"] = datetime.now(timezone.utc)
+    doc["createdAt"] = utcnow()
     doc["type"] = "comment"
 
-    try:
-        res = await app.db[COLL].insert_one(doc)
-    except Exception:
-        return JSONResponse(status_code=500, content={"message": "Internal server error while creating comment"})
+    if app.comment_batcher:
+        # the batch's post-flush hook has bumped the book's generation and fed the feed
+        try:
+            await app.comment_batcher.insert(doc)
+        except Exception:
+            return JSONResponse(status_code=500, content={"message": "Internal server error while creating comment"})
+    else:
+        try:
+            await app.storage.coll("comment").insert_one(doc)
+        except Exception:
+            return JSONResponse(status_code=500, content={"message": "Internal server error while creating comment"})
+
+        await touch_book(payload.bookId)
+        await app.feed_events.added(doc)
 
-    created = await app.db[COLL].find_one({"_id": res.inserted_id})
     return {
         "message": "Comment created successfully",
-        "data": to_comment_out(created).model_dump(),
+        "data": to_comment_out(doc).model_dump(),
     }
 
+@app.post(
+    "/reviews/averages",
+    description=(
+        "Returns the average star rating and review count for many books in one call. "
+        "All aggregates are read with a single query; books without any reviews are listed under `missing` instead of failing the request."
+    ),
+    summary="Average ratings for many books",
+    tags=["Reviews"],
+    response_model=Averages,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Average ratings fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Average ratings fetched successfully",
+                        "data": {
+                            "items": {
+                                "b1": {"average": 4.3, "count": 12},
+                                "b2": {"average": 3.5, "count": 2}
+                            },
+                            "missing": ["b3"]
+                        }
+                    }
+                }
+            }
+        },
+        400: {"description": "Bad Request", "content": {"application/json": {"example": {"message": "Bad request", "errors": [{"loc": ["body", "bookIds"], "msg": "List should have at least 1 item after validation, not 0", "type": "too_short"}]}}}},
+        500: {"description": "Internal Server Error", "content": {"application/json": {"example": {"message": "Internal server error while fetching averages"}}}},
+    },
+    name="averageScoresForBooks",
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "example": {"bookIds": ["b1", "b2", "b3"]}
+                }
+            }
+        }
+    },
+)
+async def average_scores_for_books(body: AveragesIn):
+    book_ids = list(dict.fromkeys(body.bookIds))
+    try:
+        cursor = app.storage.coll(RATING_TYPE).find(
+            {"type": RATING_TYPE, "bookId": {"$in": book_ids}},
+            {"bookId": 1, "sum": 1, "count": 1},
+        )
+        docs = await cursor.to_list(length=len(book_ids))
+    except Exception:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Internal server error while fetching averages"},
+        )
+
+    items = {}
+    for doc in docs:
+        avg = average_of(doc)
+        if avg is not None:
+            items[doc["bookId"]] = {"average": avg, "count": doc["count"]}
+
+    return respond({
+        "message": "Average ratings fetched successfully",
+        "data": {"items": items, "missing": [b for b in book_ids if b not in items]},
+    })
+
+@app.post(
+    "/reviews/user/{userId}/lookup",
+    description=(
+        "Returns one user's reviews for many books in one call, keyed by bookId, e.g. to show \"your rating\" on a shelf page. "
+        "All reviews are read with a single query on the (type, userId, bookId) index; books the user has not reviewed are listed under `missing`. "
+        "`fields` limits which review fields are returned; `id` is always included."
+    ),
+    summary="User's reviews for many books",
+    tags=["Reviews"],
+    response_model=ReviewLookup,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Reviews fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Reviews fetched successfully",
+                        "data": {
+                            "items": {
+                                "b1": {
+                                    "id": "abc123",
+                                    "userId": "u1",
+                                    "bookId": "b1",
+                                    "rating": 5,
+                                    "review": "Great book!",
+                                    "createdAt": "2025-07-16T12:00:00Z"
+                                }
+                            },
+                            "missing": ["b2"]
+                        }
+                    }
+                }
+            }
+        },
+        400: {"description": "Bad Request", "content": {"application/json": {"example": {"message": "Bad request", "errors": [{"loc": ["body", "bookIds"], "msg": "List should have at most 500 items after validation, not 501", "type": "too_long"}]}}}},
+        500: {"description": "Internal Server Error", "content": {"application/json": {"example": {"message": "Internal server error while fetching reviews"}}}},
+    },
+    name="reviewsByUserForBooks",
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "example": {"bookIds": ["b1", "b2"]}
+                }
+            }
+        }
+    },
+)
+async def reviews_by_user_for_books(
+    userId: str,
+    body: ReviewLookupIn,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. `rating,createdAt`; `id` is always included"),
+):
+    try:
+        picked = parse_fields(fields, REVIEW_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(str(e))
+
+    book_ids = list(dict.fromkeys(body.bookIds))
+    try:
+        cursor = app.storage.coll("review").find(
+            {
+                "type": "review",
+                "userId": userId,
+                "bookId": {"$in": book_ids},
+                "rating": {"$gte": 1, "$lte": 5},
+            },
+            REVIEW_PROJECTION if picked is None else fields_projection(picked, always=("bookId",)),
+        )
+        docs = await cursor.to_list(length=len(book_ids))
+    except Exception:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Internal server error while fetching reviews"},
+        )
+
+    items = {doc["bookId"]: review_dict(doc) if picked is None else sparse_dict(doc, picked) for doc in docs}
+    return respond({
+        "message": "Reviews fetched successfully",
+        "data": {
+            "items": items,
+            "missing": [b for b in book_ids if b not in items],
+        },
+    }, raw=picked is not None)
+
+@app.post(
+    "/reviews/bulk",
+    description=(
+        "Imports reviews and comments from a newline-delimited JSON (NDJSON) request body. "
+        "Each line is a NewReviewIn or NewCommentIn object; an optional `type` field ('review' or 'comment') "
+        "selects the schema, otherwise lines with a `comment` field are comments. An optional ISO 8601 `createdAt` "
+        "keeps the original date of imported items; lines without one are stamped when they are written. Lines are validated and written "
+        "in chunks with unordered bulk inserts, and book existence is checked once per distinct bookId per chunk. "
+        "The response streams one NDJSON result per input line in input order, followed by a summary line."
+    ),
+    summary="Bulk import reviews and comments (NDJSON)",
+    tags=["Reviews"],
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Per-line import results",
+            "content": {
+                "application/x-ndjson": {
+                    "example": (
+                        '{"line": 1, "status": 201, "id": "64e2b1f2c2a1b2c3d4e5f6a7", "type": "review"}\n'
+                        '{"line": 2, "status": 409, "message": "Review already exists for this user and book"}\n'
+                        '{"line": 3, "status": 404, "message": "Book with id=\'b9\' not found"}\n'
+                        '{"summary": {"created": 1, "failed": 2}}\n'
+                    )
+                }
+            }
+        },
+        503: {"description": "Unique indexes not built yet", "content": {"application/json": {"example": {"message": "Indexes are still being built, retry the import shortly"}}}},
+    },
+    name="bulkImportReviews",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"type": "string"},
+                    "example": (
+                        '{"userId": "u1", "bookId": "b1", "rating": 5, "review": "Great book!"}\n'
+                        '{"userId": "u1", "bookId": "b1", "rating": 4}\n'
+                        '{"type": "comment", "userId": "u2", "bookId": "b9", "comment": "Loved the ending!"}\n'
+                    )
+                }
+            }
+        }
+    },
+)
+async def bulk_import_reviews(request: Request):
+    # duplicate reviews in an import are only caught by the unique index
+    if not app.unique_indexes_ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"message": "Indexes are still being built, retry the import shortly"},
+            headers={"Retry-After": "5"},
+        )
+    # read the body before streaming the response, see bulk.py
+    body = await spool_body(request)
+    return StreamingResponse(
+        import_ndjson(app.storage, app.books, spooled_chunks(body), chunk_size=BULK_CHUNK_SIZE, book_concurrency=BULK_BOOK_LOOKUPS),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(body.close),
+    )
+
 # ----- PUT -----
 @app.put(
     "/reviews/{id}/text",
@@ -281,25 +649,8 @@ async def add_review_to_star_rating(id: str, body: ReviewTextIn):
         )
 
     try:
-        review_doc = await app.db[COLL].find_one({"_id": _id, "type": "review"})
-    except Exception:
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": "Internal server error while finding review"},
-        )
-
-    if not review_doc:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Review not found"})
-
-    if review_doc.get("userId") != body.userId:
-        return JSONResponse(
-            status_code=status.HTTP_403_FORBIDDEN,
-            content={"message": "Forbidden: review belongs to a different user"},
-        )
-
-    try:
-        updated = await app.db[COLL].find_one_and_update(
-            {"_id": _id, "type": "review"},
+        updated = await app.storage.coll("review").find_one_and_update(
+            {"_id": _id, "type": "review", "userId": body.userId},
             {"$set": {"review": body.review}},
             return_document=ReturnDocument.AFTER
         )
@@ -310,7 +661,10 @@ async def add_review_to_star_rating(id: str, body: ReviewTextIn):
         )
 
     if not updated:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Review not found"})
+        return await owner_mismatch_response(_id, "review")
+
+    await touch_book(updated["bookId"])
+    await app.feed_events.updated(updated)
 
     return {
         "message": "Review text updated successfully",
@@ -429,27 +783,10 @@ async def change_star_rating(id: str, body: RatingIn):
         )
 
     try:
-        doc = await app.db[COLL].find_one({"_id": _id, "type": "review"})
-    except Exception:
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": "Internal server error while finding review"},
-        )
-
-    if not doc:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Review not found"})
-
-    if doc.get("userId") != body.userId:
-        return JSONResponse(
-            status_code=status.HTTP_403_FORBIDDEN,
-            content={"message": "Forbidden: review belongs to a different user"},
-        )
-
-    try:
-        updated = await app.db[COLL].find_one_and_update(
-            {"_id": _id, "type": "review"},
+        before = await app.storage.coll("review").find_one_and_update(
+            {"_id": _id, "type": "review", "userId": body.userId},
             {"$set": {"rating": body.rating}},
-            return_document=ReturnDocument.AFTER,
+            return_document=ReturnDocument.BEFORE,
         )
     except Exception:
         return JSONResponse(
@@ -457,8 +794,12 @@ async def change_star_rating(id: str, body: RatingIn):
             content={"message": "Internal server error while updating rating"},
         )
 
-    if not updated:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Review not found"})
+    if not before:
+        return await owner_mismatch_response(_id, "review")
+
+    await update_rating_aggregate(before["bookId"], add=body.rating, remove=before.get("rating"), created_at=before.get("createdAt"))
+    await app.feed_events.updated({**before, "rating": body.rating})
+    updated = {**before, "rating": body.rating}
 
     return {
         "message": "Rating updated successfully",
@@ -470,7 +811,8 @@ async def change_star_rating(id: str, body: RatingIn):
     "/reviews/user/{userId}/book/{bookId}",
     description=(
         "Retrieves a specific review by userId and bookId. "
-        "Returns the review details if found, or an error if it does not exist or a retrieval error occurs."
+        "Returns the review details if found, or an error if it does not exist or a retrieval error occurs. "
+        "`fields` limits which review fields are returned; `id` is always included."
     ),
     summary="Get review by userId and bookId",
     tags=["Reviews"],
@@ -541,14 +883,23 @@ async def change_star_rating(id: str, body: RatingIn):
     },
     name="reviewByUserAndBook",
 )
-async def review_by_user_and_book(retrieve: RetrieveReviewIn):
+async def review_by_user_and_book(
+    userId: str,
+    bookId: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. `rating,createdAt`; `id` is always included"),
+):
+    try:
+        picked = parse_fields(fields, REVIEW_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(str(e))
+
     try:
-        doc = await app.db[COLL].find_one({
+        doc = await app.storage.coll("review").find_one({
             "type": "review",
-            "userId": retrieve.userId,
-            "bookId": retrieve.bookId,
+            "userId": userId,
+            "bookId": bookId,
             "rating": {"$gte": 1, "$lte": 5},
-        })
+        }, REVIEW_PROJECTION if picked is None else fields_projection(picked))
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -558,77 +909,48 @@ async def review_by_user_and_book(retrieve: RetrieveReviewIn):
     if not doc:
         return JSONResponse(
             status_code=status.HTTP_404_NOT_FOUND,
-            content={"message": f"Review not found for userId='{retrieve.userId}' and bookId='{retrieve.bookId}'"},
+            content={"message": f"Review not found for userId='{userId}' and bookId='{bookId}'"},
         )
 
-    return {
+    return respond({
         "message": "Review fetched successfully",
-        "data": to_out(doc).model_dump(),
-    }
+        "data": review_dict(doc) if picked is None else sparse_dict(doc, picked),
+    }, raw=picked is not None)
 
 @app.get(
-    "/books/{bookId}/reviews",
-    summary="List reviews for a book",
+    "/reviews/search",
     description=(
-        "Retrieves all reviews for a given book and returns them sorted by creation time (newest first). "
-        "Validates the book exists via book-service before listing."
+        "Full-text search over review and comment text, ranked by relevance. "
+        "Backed by a Mongo text index, so words are stemmed and common stop words ignored; "
+        "quoted phrases and -negated words are supported. Each hit carries an HTML-escaped snippet "
+        "with the matching words wrapped in <mark>. Use nextOffset to fetch the next page."
     ),
+    summary="Search reviews and comments",
     tags=["Reviews"],
-    operation_id="allReviewsByBookId",
-    response_model=ReviewsList,
-    response_model_exclude_none=True,
+    response_model=SearchResults,
     status_code=status.HTTP_200_OK,
     responses={
         200: {
-            "description": "Reviews fetched successfully",
+            "description": "Search results",
             "content": {
                 "application/json": {
-                    "examples": {
-                        "two_items": {
-                            "summary": "Two reviews",
-                            "value": {
-                                "message": "Reviews fetched successfully",
-                                "data": {
-                                    "items": [
-                                        {
-                                            "id": "abc123",
-                                            "userId": "u1",
-                                            "bookId": "b1",
-                                            "rating": 5,
-                                            "review": "Great book!",
-                                            "createdAt": "2025-07-16T12:00:00Z"
-                                        },
-                                        {
-                                            "id": "def456",
-                                            "userId": "u2",
-                                            "bookId": "b1",
-                                            "rating": 4,
-                                            "review": "Enjoyed it.",
-                                            "createdAt": "2025-07-17T09:30:00Z"
-                                        }
-                                    ],
-                                    "count": 2
-                                }
-                            }
-                        },
-                        "single_item": {
-                            "summary": "One review",
-                            "value": {
-                                "message": "Reviews fetched successfully",
-                                "data": {
-                                    "items": [
-                                        {
-                                            "id": "xyz789",
-                                            "userId": "u9",
-                                            "bookId": "b1",
-                                            "rating": 3,
-                                            "review": "Decent.",
-                                            "createdAt": "2025-07-18T15:10:00Z"
-                                        }
-                                    ],
-                                    "count": 1
+                    "example": {
+                        "message": "Search completed successfully",
+                        "data": {
+                            "items": [
+                                {
+                                    "id": "abc123",
+                                    "type": "review",
+                                    "userId": "u1",
+                                    "bookId": "b1",
+                                    "rating": 5,
+                                    "snippet": "The <mark>ending</mark> took me by surprise…",
+                                    "score": 1.1,
+                                    "createdAt": "2025-07-16T12:00:00Z"
                                 }
-                            }
+                            ],
+                            "count": 1,
+                            "nextOffset": None
                         }
                     }
                 }
@@ -638,50 +960,271 @@ async def review_by_user_and_book(retrieve: RetrieveReviewIn):
             "description": "Bad request",
             "content": {
                 "application/json": {
-                    "examples": {
-                        "invalid_book_id": {
-                            "summary": "Invalid bookId format",
-                            "value": {
-                                "message": "Bad request",
-                                "errors": [
-                                    {"loc": ["path", "bookId"], "msg": "Invalid bookId", "type": "value_error"}
-                                ]
-                            }
-                        }
+                    "example": {
+                        "message": "Bad request",
+                        "errors": [{"loc": ["query", "q"], "msg": "Field required", "type": "missing"}]
                     }
                 }
             }
         },
-        404: {
-            "description": "Book not found or no reviews",
+        500: {
+            "description": "Internal server error while searching",
             "content": {
                 "application/json": {
-                    "examples": {
-                        "no_reviews": {
-                            "summary": "Book exists but no reviews",
-                            "value": {"message": "Book not found or no reviews for bookId='b1'"}
-                        },
-                        "missing_book": {
-                            "summary": "Book does not exist",
-                            "value": {"message": "Book with id='b1' not found"}
-                        }
-                    }
+                    "example": {"message": "Internal server error while searching reviews"}
                 }
             }
-        },
-        502: {
-            "description": "Upstream book-service error",
-            "content": {
-                "application/json": {
-                    "example": {"message": "Error checking book existence in book-service"}
+        }
+    },
+    name="searchReviews",
+)
+async def search_reviews(
+    q: str = Query(..., min_length=1, max_length=200, description="Search text"),
+    bookId: Optional[str] = Query(None, min_length=1, description="Only search this book"),
+    type: Literal["review", "comment", "all"] = Query("all", description="Which documents to search"),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+):
+    kinds = ["review", "comment"] if type == "all" else [type]
+    projection = {**REVIEW_PROJECTION, **COMMENT_PROJECTION, "type": 1, "score": {"$meta": "textScore"}}
+    by_score = [("score", {"$meta": "textScore"})]
+    try:
+        if app.storage.same_collection(*kinds):
+            cursor = (
+                app.storage.coll(kinds[0])
+                .find(search_query(q, kinds, bookId), projection)
+                .sort(by_score)
+                .skip(offset)
+                .limit(limit + 1)
+            )
+            docs = await cursor.to_list(length=limit + 1)
+        else:
+            # each collection has its own text index: take every kind's best hits and merge them
+            parts = await asyncio.gather(*(
+                app.storage.coll(k).find(search_query(q, [k], bookId), projection).sort(by_score).limit(offset + limit + 1)
+                .to_list(length=offset + limit + 1)
+                for k in kinds
+            ))
+            docs = sorted((d for part in parts for d in part), key=lambda d: d["score"], reverse=True)[offset:offset + limit + 1]
+    except Exception:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Internal server error while searching reviews"},
+        )
+
+    terms = search_terms(q)
+    items = [
+        {
+            "id": str(d["_id"]),
+            "type": d["type"],
+            "userId": d["userId"],
+            "bookId": d["bookId"],
+            "rating": d.get("rating"),
+            "snippet": snippet(d.get("review") or d.get("comment") or "", terms),
+            "score": round(d["score"], 4),
+            "createdAt": d["createdAt"],
+        }
+        for d in docs[:limit]
+    ]
+    return respond({
+        "message": "Search completed successfully",
+        "data": {
+            "items": items,
+            "count": len(items),
+            "nextOffset": offset + limit if len(docs) > limit else None,
+        },
+    })
+
+@app.get(
+    "/reviews/recent",
+    description=(
+        "Latest reviews and comments across all books, newest first. Served from an in-memory feed of the newest "
+        "RECENT_FEED_SIZE items that is warmed from the database at startup and updated by every create, edit and delete, "
+        "so polling it does not touch the database. Items imported through /reviews/bulk are not added to the feed."
+    ),
+    summary="Recent reviews and comments",
+    tags=["Reviews"],
+    response_model=Recent,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Recent activity fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Recent activity fetched successfully",
+                        "data": {
+                            "items": [
+                                {
+                                    "type": "comment",
+                                    "id": "c1",
+                                    "userId": "u2",
+                                    "bookId": "b1",
+                                    "comment": "Loved the ending!",
+                                    "createdAt": "2025-07-16T13:00:00Z"
+                                },
+                                {
+                                    "type": "review",
+                                    "id": "abc123",
+                                    "userId": "u1",
+                                    "bookId": "b7",
+                                    "rating": 5,
+                                    "review": "Great book!",
+                                    "createdAt": "2025-07-16T12:00:00Z"
+                                }
+                            ],
+                            "count": 2
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="recentActivity",
+)
+async def recent_activity(
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of items"),
+    type: Literal["review", "comment", "all"] = Query("all", description="Which documents to list"),
+):
+    def build():
+        items = app.feed.latest(limit, None if type == "all" else type)
+        return encode({
+            "message": "Recent activity fetched successfully",
+            "data": {"items": items, "count": len(items)},
+        })
+
+    return respond_encoded(app.feed.memo((limit, type), build))
+
+@app.get(
+    "/books/{bookId}/reviews",
+    summary="List reviews for a book",
+    description=(
+        "Retrieves reviews for a given book sorted by creation time (newest first), one page at a time. "
+        "Pass the returned nextCursor as `after` to fetch the next page; nextCursor is omitted on the last page. "
+        "book-service is consulted only when the first page is empty, to tell a book without reviews from a book that does not exist; "
+        "the X-Book-Validation header says whether that check was skipped, verified or unavailable. "
+        "Pass `fields` (e.g. `rating,createdAt`) to return only those fields of each review."
+    ),
+    tags=["Reviews"],
+    operation_id="allReviewsByBookId",
+    response_model=ReviewsList,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Reviews fetched successfully",
+            "headers": {
+                "X-Book-Validation": {
+                    "description": "`skipped` when the page had reviews, so book-service was not consulted",
+                    "schema": {"type": "string", "enum": ["skipped"]}
+                }
+            },
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "two_items": {
+                            "summary": "Two reviews",
+                            "value": {
+                                "message": "Reviews fetched successfully",
+                                "data": {
+                                    "items": [
+                                        {
+                                            "id": "abc123",
+                                            "userId": "u1",
+                                            "bookId": "b1",
+                                            "rating": 5,
+                                            "review": "Great book!",
+                                            "createdAt": "2025-07-16T12:00:00Z"
+                                        },
+                                        {
+                                            "id": "def456",
+                                            "userId": "u2",
+                                            "bookId": "b1",
+                                            "rating": 4,
+                                            "review": "Enjoyed it.",
+                                            "createdAt": "2025-07-17T09:30:00Z"
+                                        }
+                                    ],
+                                    "count": 2,
+                                    "nextCursor": "eyJ0IjoiMjAyNS0wNy0xN1QwOTozMDowMCIsImlkIjoiZGVmNDU2In0"
+                                }
+                            }
+                        },
+                        "single_item": {
+                            "summary": "One review",
+                            "value": {
+                                "message": "Reviews fetched successfully",
+                                "data": {
+                                    "items": [
+                                        {
+                                            "id": "xyz789",
+                                            "userId": "u9",
+                                            "bookId": "b1",
+                                            "rating": 3,
+                                            "review": "Decent.",
+                                            "createdAt": "2025-07-18T15:10:00Z"
+                                        }
+                                    ],
+                                    "count": 1
+                                }
+                            }
+                        }
+                    }
                 }
             }
         },
-        503: {
-            "description": "Book-service unavailable",
+        400: {
+            "description": "Bad request",
             "content": {
                 "application/json": {
-                    "example": {"message": "Error connecting to book-service"}
+                    "examples": {
+                        "invalid_book_id": {
+                            "summary": "Invalid bookId format",
+                            "value": {
+                                "message": "Bad request",
+                                "errors": [
+                                    {"loc": ["path", "bookId"], "msg": "Invalid bookId", "type": "value_error"}
+                                ]
+                            }
+                        },
+                        "invalid_cursor": {
+                            "summary": "Malformed after cursor",
+                            "value": {
+                                "message": "Bad request",
+                                "errors": [
+                                    {"loc": ["query", "after"], "msg": "invalid cursor", "type": "value_error"}
+                                ]
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Book not found or no reviews",
+            "headers": {
+                "X-Book-Validation": {
+                    "description": "`verified` when book-service answered, `unavailable` when it could not be reached",
+                    "schema": {"type": "string", "enum": ["verified", "unavailable"]}
+                }
+            },
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "no_reviews": {
+                            "summary": "Book exists but no reviews",
+                            "value": {"message": "No reviews for bookId='b1'", "data": {"items": [], "count": 0}}
+                        },
+                        "missing_book": {
+                            "summary": "Book does not exist",
+                            "value": {"message": "Book with id='b1' not found"}
+                        },
+                        "unverified": {
+                            "summary": "No reviews and book-service unavailable",
+                            "value": {"message": "Book not found or no reviews for bookId='b1'"}
+                        }
+                    }
                 }
             }
         },
@@ -696,58 +1239,79 @@ async def review_by_user_and_book(retrieve: RetrieveReviewIn):
     },
     name="allReviewsByBookId",
 )
-async def all_reviews_by_book_id(bookId: str):              #, limit: int = 20, skip: int = 0
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(f"{BOOKS_API_URL}/books/{bookId}")
-            if resp.status_code == 404:
-                return JSONResponse(
-                    status_code=404,
-                    content={"message": f"Book with id='{bookId}' not found"},
-                )
-            elif resp.status_code != 200:
-                return JSONResponse(
-                    status_code=500,
-                    content={"message": "Error checking book existence in book-service"},
-                )
-        except Exception:
-            return JSONResponse(
-                status_code=500,
-                content={"message": "Error connecting to book-service"},
-            )
-    
+async def all_reviews_by_book_id(
+    response: Response,
+    bookId: str,
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of reviews on the page"),
+    after: Optional[str] = Query(None, description="Opaque cursor from the previous page's nextCursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. `rating,createdAt`; `id` is always included"),
+):
     try:
-        cursor = (
-            app.db[COLL]
-            .find({"type": "review", "bookId": bookId})
-            .sort("createdAt", -1)
-            # .skip(skip*limit)
-            # .limit(limit)
-        )
-        items = [to_out(d) async for d in cursor]
+        picked = parse_fields(fields, REVIEW_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(str(e))
+    projection = REVIEW_PROJECTION if picked is None else fields_projection(picked, always=("createdAt",))
+
+    key, body = await cached_listing("allReviewsByBookId", bookId, limit, after, picked and ",".join(picked))
+    if body is not None:
+        headers = {"X-Book-Validation": "skipped", "X-Cache": "hit"}
+        response.headers.update(headers)
+        return respond_encoded(body, headers=headers, raw=picked is not None)
+
+    async def load():
+        docs, next_cursor = await fetch_page(app.storage.coll("review"), {"type": "review", "bookId": bookId}, limit, after, projection)
+        # a book with reviews exists, so book-service is only asked about an empty first page
+        validation = await book_validation(bookId) if not docs and not after else "skipped"
+        return docs, next_cursor, validation
+
+    try:
+        # the cache key carries the book's generation, so a request that read a newer
+        # generation never joins a load started before the write and caches its result
+        docs, next_cursor, validation = await app.single_flight.do(("allReviewsByBookId", key, bookId, limit, after, picked), load)
+    except ValueError:
+        return invalid_cursor_response()
     except Exception:
         return JSONResponse(
             status_code=500,
             content={"message": "Internal server error while listing reviews"},
         )
 
-    if not items:
-        return JSONResponse(
-            status_code=404,
-            content={"message": f"Book not found or no reviews for bookId='{bookId}'"},
-        )
+    if validation != "skipped":
+        headers = {"X-Book-Validation": validation}
+        if validation == "missing":
+            headers["X-Book-Validation"] = "verified"
+            content = {"message": f"Book with id='{bookId}' not found"}
+        elif validation == "verified":
+            content = {"message": f"No reviews for bookId='{bookId}'", "data": {"items": [], "count": 0}}
+        else:
+            content = {"message": f"Book not found or no reviews for bookId='{bookId}'"}
+        return JSONResponse(status_code=404, content=content, headers=headers)
 
-    return {
+    # response_model_exclude_none applies to this route, so None fields are left out here too
+    if picked is None:
+        items = [review_dict(d, exclude_none=True) for d in docs]
+    else:
+        items = [sparse_dict(d, picked) for d in docs]
+    data = {"items": items, "count": len(docs)}
+    if next_cursor:
+        data["nextCursor"] = next_cursor
+    body = encode({
         "message": "Reviews fetched successfully",
-        "data": ReviewsListData(items=items, count=len(items)).model_dump(),
-    }
+        "data": data,
+    })
+    if key:
+        await app.cache.set(key, body)
+    headers = {"X-Book-Validation": "skipped", "X-Cache": "miss"}
+    response.headers.update(headers)  # used when respond_encoded() hands the dict back to FastAPI
+    return respond_encoded(body, headers=headers, raw=picked is not None)
 
 @app.get(
     "/books/{bookId}/comments",
-    description="Function retrieves all comments for a specific book, identified by its book ID. It returns a list of comments sorted by creation date, or an error message if no comments are found or if an error occurs during retrieval.",
+    description="Function retrieves comments for a specific book, identified by its book ID, one page at a time. It returns a list of comments sorted by creation date (newest first) with a nextCursor to pass as `after` for the next page (omitted on the last page), or an error message if no comments are found or if an error occurs during retrieval. Pass `fields` to return only some fields of each comment.",
     summary="Get all comments for a book",
     tags=["Reviews"],
     response_model=CommentsList,
+    response_model_exclude_none=True,
     status_code=status.HTTP_200_OK,
     responses={
         200: {
@@ -783,15 +1347,25 @@ async def all_reviews_by_book_id(bookId: str):              #, limit: int = 20,
             "description": "Bad request",
             "content": {
                 "application/json": {
-                    "example": {
-                        "message": "Bad request",
-                        "errors": [
-                            {
-                                "loc": ["path", "bookId"],
-                                "msg": "Invalid bookId",
-                                "type": "value_error"
+                    "examples": {
+                        "invalid_book_id": {
+                            "summary": "Invalid bookId format",
+                            "value": {
+                                "message": "Bad request",
+                                "errors": [
+                                    {"loc": ["path", "bookId"], "msg": "Invalid bookId", "type": "value_error"}
+                                ]
                             }
-                        ]
+                        },
+                        "invalid_cursor": {
+                            "summary": "Malformed after cursor",
+                            "value": {
+                                "message": "Bad request",
+                                "errors": [
+                                    {"loc": ["query", "after"], "msg": "invalid cursor", "type": "value_error"}
+                                ]
+                            }
+                        }
                     }
                 }
             }
@@ -807,110 +1381,577 @@ async def all_reviews_by_book_id(bookId: str):              #, limit: int = 20,
             }
         },
         500: {
-            "description": "Internal server error while listing comments",
+            "description": "Internal server error while listing comments",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Internal server error while listing comments"
+                    }
+                }
+            }
+        }
+    },
+    name="allCommentsByBookId",
+)
+async def all_comments_by_book_id(
+    response: Response,
+    bookId: str,
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of comments on the page"),
+    after: Optional[str] = Query(None, description="Opaque cursor from the previous page's nextCursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. `rating,createdAt`; `id` is always included"),
+):
+    try:
+        picked = parse_fields(fields, COMMENT_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(str(e))
+    projection = COMMENT_PROJECTION if picked is None else fields_projection(picked, always=("createdAt",))
+
+    key, body = await cached_listing("allCommentsByBookId", bookId, limit, after, picked and ",".join(picked))
+    if body is not None:
+        response.headers["X-Cache"] = "hit"
+        return respond_encoded(body, headers={"X-Cache": "hit"}, raw=picked is not None)
+
+    try:
+        docs, next_cursor = await fetch_page(app.storage.coll("comment"), {"type": "comment", "bookId": bookId}, limit, after, projection)
+    except ValueError:
+        return invalid_cursor_response()
+    except Exception:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Internal server error while listing comments"},
+        )
+
+    if not docs and not after:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"Book not found or no comments for bookId='{bookId}'"},
+        )
+
+    # nextCursor is left out on the last page, as in the reviews listing
+    data = {"items": [comment_dict(d) if picked is None else sparse_dict(d, picked) for d in docs], "count": len(docs)}
+    if next_cursor:
+        data["nextCursor"] = next_cursor
+    body = encode({
+        "message": "Comments fetched successfully",
+        "data": data,
+    })
+    if key:
+        await app.cache.set(key, body)
+    response.headers["X-Cache"] = "miss"
+    return respond_encoded(body, headers={"X-Cache": "miss"}, raw=picked is not None)
+
+@app.get(
+    "/books/{bookId}/discussion",
+    description=(
+        "Everything a book page shows in one call: the first page of reviews and of comments (newest first), "
+        "how many of each the book has, and its rating summary. All of it comes from a single aggregation whose "
+        "branches each read one page through an index; the review count is the one in the rating summary. "
+        "Pass reviewsAfter / commentsAfter (the nextCursor of each list) to page through one list independently. "
+        "Book existence is not checked with book-service; an unknown bookId simply has an empty discussion."
+    ),
+    summary="Reviews, comments and rating of a book in one call",
+    tags=["Reviews"],
+    response_model=Discussion,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Discussion fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Discussion fetched successfully",
+                        "data": {
+                            "reviews": {
+                                "items": [
+                                    {
+                                        "id": "abc123",
+                                        "userId": "u1",
+                                        "bookId": "b1",
+                                        "rating": 5,
+                                        "review": "Great book!",
+                                        "createdAt": "2025-07-16T12:00:00Z"
+                                    }
+                                ],
+                                "count": 1,
+                                "nextCursor": "eyJ0IjoiMjAyNS0wNy0xNlQxMjowMDowMCIsImlkIjoiYWJjMTIzIn0"
+                            },
+                            "comments": {
+                                "items": [
+                                    {
+                                        "id": "c1",
+                                        "userId": "u2",
+                                        "bookId": "b1",
+                                        "comment": "Loved the ending!",
+                                        "createdAt": "2025-07-16T13:00:00Z"
+                                    }
+                                ],
+                                "count": 1
+                            },
+                            "counts": {"reviews": 2, "comments": 1},
+                            "rating": {
+                                "bookId": "b1",
+                                "count": 2,
+                                "mean": 4.5,
+                                "bayesian": 3.25,
+                                "histogram": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1},
+                                "prior": {"mean": 3.0, "weight": 10.0}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Invalid cursor",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Bad request",
+                        "errors": [{"loc": ["query", "reviewsAfter"], "msg": "invalid cursor", "type": "value_error"}]
+                    }
+                }
+            }
+        },
+        500: {
+            "description": "Internal server error while fetching discussion",
+            "content": {
+                "application/json": {
+                    "example": {"message": "Internal server error while fetching discussion"}
+                }
+            }
+        }
+    },
+    name="discussionForBook",
+)
+async def discussion_for_book(
+    bookId: str,
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of reviews and of comments on the page"),
+    reviewsAfter: Optional[str] = Query(None, description="Cursor from the previous page's reviews.nextCursor"),
+    commentsAfter: Optional[str] = Query(None, description="Cursor from the previous page's comments.nextCursor"),
+):
+    # one round trip: the rating aggregate, then one indexed branch per list
+    # (type_bookId_createdAt_id); the review count is the aggregate's, comments
+    # are counted on the same index
+    match = {"bookId": bookId}
+    try:
+        review_stages = page_pipeline({"type": "review", **match}, limit, reviewsAfter, {**REVIEW_PROJECTION, "type": 1})
+    except ValueError:
+        return invalid_cursor_response("reviewsAfter")
+    try:
+        comment_stages = page_pipeline({"type": "comment", **match}, limit, commentsAfter, {**COMMENT_PROJECTION, "type": 1})
+    except ValueError:
+        return invalid_cursor_response("commentsAfter")
+    pipeline = [
+        {"$match": {"type": RATING_TYPE, **match}},
+        {"$limit": 1},
+        {"$project": {"type": 1, "bookId": 1, "sum": 1, "count": 1, "hist": 1}},
+        app.storage.union_with("review", review_stages),
+        app.storage.union_with("comment", comment_stages),
+        app.storage.union_with("comment", [{"$match": {"type": "comment", **match}}, {"$count": "commentCount"}]),
+    ]
+
+    try:
+        docs = await app.storage.coll(RATING_TYPE).aggregate(pipeline).to_list(length=None)
+    except Exception:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Internal server error while fetching discussion"},
+        )
+    result = {"reviews": [], "comments": [], "rating": [], "commentCount": 0}
+    for d in docs:
+        if "commentCount" in d:
+            result["commentCount"] = d["commentCount"]
+        else:
+            result[{"review": "reviews", "comment": "comments"}.get(d.pop("type", None), "rating")].append(d)
+
+    reviews, reviews_next = split_page(result["reviews"], limit)
+    comments, comments_next = split_page(result["comments"], limit)
+    rating = summary_of(result["rating"][0]) if result["rating"] else None
+
+    # response_model_exclude_none applies to this route, so None fields are left out here too
+    data = {
+        "reviews": {"items": [review_dict(d, exclude_none=True) for d in reviews], "count": len(reviews)},
+        "comments": {"items": [comment_dict(d) for d in comments], "count": len(comments)},
+        "counts": {"reviews": rating["count"] if rating else 0, "comments": result["commentCount"]},
+    }
+    if reviews_next:
+        data["reviews"]["nextCursor"] = reviews_next
+    if comments_next:
+        data["comments"]["nextCursor"] = comments_next
+    if rating:
+        data["rating"] = rating
+    return respond({
+        "message": "Discussion fetched successfully",
+        "data": data,
+    })
+
+@app.get(
+    "/reviews/{bookId}/average",
+    description=(
+        "Returns the average star rating for the given book across all reviews. "
+        "Only ratings in the range 1–5 are considered. The average is read from the book's rating aggregate, "
+        "which is kept current on every review write. Returns the average as a float."
+    ),
+    summary="Average rating for a book",
+    tags=["Reviews"],
+    response_model=AverageScore,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Average rating calculated successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Average rating calculated successfully",
+                        "data": { "average": 4.3 }
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "No reviews found for the book",
+            "content": {
+                "application/json": {
+                    "example": { "message": "No reviews for bookId='b1'" }
+                }
+            }
+        },
+        500: {
+            "description": "Internal server error while calculating average",
+            "content": {
+                "application/json": {
+                    "example": { "message": "Internal server error while calculating average" }
+                }
+            }
+        }
+    },
+    name="averageScoreForReview",
+)
+async def average_score_for_review(bookId: str):
+    try:
+        agg = await app.single_flight.do(
+            ("averageScoreForReview", bookId),
+            lambda: app.storage.coll(RATING_TYPE).find_one({"type": RATING_TYPE, "bookId": bookId}, {"sum": 1, "count": 1}),
+        )
+    except Exception:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Internal server error while calculating average"},
+        )
+
+    avg = average_of(agg)
+    if avg is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"No reviews for bookId='{bookId}'"},
+        )
+
+    return respond({
+        "message": "Average rating calculated successfully",
+        "data": {"average": avg},
+    })
+
+@app.get(
+    "/books/{bookId}/ratings/summary",
+    description=(
+        "Returns the rating distribution of a book: the 1–5 histogram, review count, mean, and a Bayesian-smoothed score "
+        "(priorWeight virtual ratings of priorMean added to the real ones), which ranks books with few reviews fairly "
+        "against books with many. Served from the book's rating aggregate, not computed from the reviews. "
+        "The prior defaults to RATING_PRIOR_MEAN / RATING_PRIOR_WEIGHT and can be overridden per call."
+    ),
+    summary="Rating histogram and Bayesian average for a book",
+    tags=["Reviews"],
+    response_model=RatingSummary,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Rating summary fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Rating summary fetched successfully",
+                        "data": {
+                            "bookId": "b1",
+                            "count": 3,
+                            "mean": 4.67,
+                            "bayesian": 3.38,
+                            "histogram": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 2},
+                            "prior": {"mean": 3.0, "weight": 10.0}
+                        }
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "No reviews found for the book",
+            "content": {
+                "application/json": {
+                    "example": {"message": "No reviews for bookId='b1'"}
+                }
+            }
+        },
+        500: {
+            "description": "Internal server error while fetching rating summary",
+            "content": {
+                "application/json": {
+                    "example": {"message": "Internal server error while fetching rating summary"}
+                }
+            }
+        }
+    },
+    name="ratingSummaryForBook",
+)
+async def rating_summary_for_book(
+    bookId: str,
+    priorMean: Optional[float] = Query(None, ge=1, le=5, description="Mean of the prior; defaults to RATING_PRIOR_MEAN"),
+    priorWeight: Optional[float] = Query(None, ge=0, le=100_000, description="Number of virtual prior ratings; defaults to RATING_PRIOR_WEIGHT"),
+):
+    try:
+        agg = await app.storage.coll(RATING_TYPE).find_one(
+            {"type": RATING_TYPE, "bookId": bookId},
+            {"bookId": 1, "sum": 1, "count": 1, "hist": 1},
+        )
+    except Exception:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Internal server error while fetching rating summary"},
+        )
+
+    summary = summary_of(
+        agg,
+        prior_mean=PRIOR_MEAN if priorMean is None else priorMean,
+        prior_weight=PRIOR_WEIGHT if priorWeight is None else priorWeight,
+    )
+    if summary is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"No reviews for bookId='{bookId}'"},
+        )
+
+    return respond({
+        "message": "Rating summary fetched successfully",
+        "data": summary,
+    })
+
+@app.get(
+    "/books/{bookId}/ratings/trend",
+    description=(
+        "How a book's rating developed over time: review count, mean and 1–5 histogram per calendar month or ISO week "
+        "(e.g. 2025-07 or 2025-W29), oldest first, covering the latest `periods` periods that have reviews. "
+        "A review counts in the period it was written in, also after it is re-rated. Served from rollups kept current "
+        "on every review write, so the cost does not depend on how many reviews the book has."
+    ),
+    summary="Rating trend of a book per month or week",
+    tags=["Reviews"],
+    response_model=RatingTrend,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Rating trend fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Rating trend fetched successfully",
+                        "data": {
+                            "bookId": "b1",
+                            "bucket": "month",
+                            "items": [
+                                {"period": "2025-06", "count": 4, "mean": 3.75, "histogram": {"1": 0, "2": 1, "3": 0, "4": 2, "5": 1}},
+                                {"period": "2025-07", "count": 2, "mean": 4.5, "histogram": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}}
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "No reviews found for the book",
+            "content": {
+                "application/json": {
+                    "example": {"message": "No reviews for bookId='b1'"}
+                }
+            }
+        },
+        500: {
+            "description": "Internal server error while fetching rating trend",
             "content": {
                 "application/json": {
-                    "example": {
-                        "message": "Internal server error while listing comments"
-                    }
+                    "example": {"message": "Internal server error while fetching rating trend"}
                 }
             }
         }
     },
-    name="allCommentsByBookId",
+    name="ratingTrendForBook",
 )
-async def all_comments_by_book_id(bookId: str):
+async def rating_trend_for_book(
+    bookId: str,
+    bucket: Literal["month", "week"] = Query("month", description="Period length"),
+    periods: int = Query(24, ge=1, le=520, description="Maximum number of periods, counting back from the latest"),
+):
     try:
         cursor = (
-            app.db[COLL]
-            .find({"type": "comment", "bookId": bookId})
-            .sort("createdAt", -1)
+            app.storage.coll(TREND_TYPE)
+            .find(
+                {"type": TREND_TYPE, "bookId": bookId, "bucket": bucket, "count": {"$gt": 0}},
+                {"_id": 0, "period": 1, "sum": 1, "count": 1, "hist": 1},
+            )
+            .sort("period", -1)
+            .limit(periods)
         )
-        items = [to_comment_out(d) async for d in cursor]
+        docs = await cursor.to_list(length=periods)
     except Exception:
         return JSONResponse(
             status_code=500,
-            content={"message": "Internal server error while listing comments"},
+            content={"message": "Internal server error while fetching rating trend"},
         )
 
-    if not items:
+    if not docs:
         return JSONResponse(
             status_code=404,
-            content={"message": f"Book not found or no comments for bookId='{bookId}'"},
+            content={"message": f"No reviews for bookId='{bookId}'"},
         )
 
-    return {
-        "message": "Comments fetched successfully",
-        "data": CommentsListData(items=items, count=len(items)).model_dump(),
-    }
+    return respond({
+        "message": "Rating trend fetched successfully",
+        "data": {
+            "bookId": bookId,
+            "bucket": bucket,
+            "items": [trend_point(d) for d in reversed(docs)],
+        },
+    })
 
 @app.get(
-    "/reviews/{bookId}/average",
+    "/books/top",
     description=(
-        "Calculates the average star rating for the given book across all reviews. "
-        "Only ratings in the range 1–5 are considered. Returns the average as a float."
+        "Returns the best rated books, ranked by their Bayesian-smoothed score (see /books/{bookId}/ratings/summary for "
+        "the prior). The score is kept on each book's rating aggregate and updated atomically on every review create, "
+        "re-rate and delete, so this is an indexed range read, never an aggregation over the reviews. "
+        "minCount leaves out books with fewer reviews; genre limits the ranking to books of that genre."
     ),
-    summary="Average rating for a book",
+    summary="Top rated books",
     tags=["Reviews"],
-    response_model=AverageScore,
+    response_model=TopBooks,
     status_code=status.HTTP_200_OK,
     responses={
         200: {
-            "description": "Average rating calculated successfully",
+            "description": "Top rated books fetched successfully",
             "content": {
                 "application/json": {
                     "example": {
-                        "message": "Average rating calculated successfully",
-                        "data": { "average": 4.3 }
+                        "message": "Top rated books fetched successfully",
+                        "data": {
+                            "items": [
+                                {"rank": 1, "bookId": "b1", "score": 4.21, "average": 4.6, "count": 42, "genres": ["Fantasy"]},
+                                {"rank": 2, "bookId": "b7", "score": 3.98, "average": 4.9, "count": 8, "genres": []}
+                            ]
+                        }
                     }
                 }
             }
         },
-        404: {
-            "description": "No reviews found for the book",
-            "content": {
-                "application/json": {
-                    "example": { "message": "No reviews for bookId='b1'" }
-                }
-            }
-        },
         500: {
-            "description": "Internal server error while calculating average",
+            "description": "Internal server error while fetching top rated books",
             "content": {
                 "application/json": {
-                    "example": { "message": "Internal server error while calculating average" }
+                    "example": {"message": "Internal server error while fetching top rated books"}
                 }
             }
         }
     },
-    name="averageScoreForReview",
+    name="topRatedBooks",
 )
-async def average_score_for_review(bookId: str):
+async def top_rated_books(
+    limit: int = Query(10, ge=1, le=100, description="Number of books to return"),
+    minCount: int = Query(1, ge=1, description="Only books with at least this many reviews"),
+    genre: Optional[str] = Query(None, min_length=1, description="Only books of this genre"),
+):
+    query = {"type": RATING_TYPE, "count": {"$gte": minCount}}
+    if genre:
+        query["genres"] = genre
     try:
-        cursor = app.db[COLL].aggregate([
-            {"$match": {"type": "review", "bookId": bookId, "rating": {"$gte": 1, "$lte": 5}}},
-            {"$group": {"_id": None, "avg": {"$avg": "$rating"}}}
-        ])
-        agg = [doc async for doc in cursor]
+        cursor = (
+            app.storage.coll(RATING_TYPE)
+            .find(query, {"_id": 0, "bookId": 1, "score": 1, "sum": 1, "count": 1, "genres": 1})
+            .sort([("score", -1), ("bookId", 1)])
+            .limit(limit)
+        )
+        docs = await cursor.to_list(length=limit)
     except Exception:
         return JSONResponse(
             status_code=500,
-            content={"message": "Internal server error while calculating average"},
-        )
-
-    if not agg:
-        return JSONResponse(
-            status_code=404,
-            content={"message": f"No reviews for bookId='{bookId}'"},
+            content={"message": "Internal server error while fetching top rated books"},
         )
 
-    avg = float(agg[0]["avg"])
-    avg = round(avg, 2)
+    items = [
+        {
+            "rank": rank,
+            "bookId": d["bookId"],
+            "score": round(d["score"], 2),
+            "average": average_of(d),
+            "count": d["count"],
+            "genres": d.get("genres", []),
+        }
+        for rank, d in enumerate(docs, start=1)
+    ]
+    return respond({
+        "message": "Top rated books fetched successfully",
+        "data": {"items": items},
+    })
 
-    return {
-        "message": "Average rating calculated successfully",
-        "data": AverageScoreData(average=avg).model_dump(),
-    }
+@app.get(
+    "/export/reviews",
+    description=(
+        "Streams all reviews (or comments, with type=comment) as NDJSON or CSV. "
+        "Optionally filtered by bookId, userId and a createdAt range [createdFrom, createdTo). "
+        "Documents are read through a server-side cursor in batches of batchSize, so memory use stays constant "
+        "however large the export is. Rows are not sorted."
+    ),
+    summary="Export reviews or comments",
+    tags=["Export"],
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Export stream",
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"id": "abc123", "userId": "u1", "bookId": "b1", "rating": 5, "review": "Great book!", "createdAt": "2025-07-16T12:00:00"}\n'
+                },
+                "text/csv": {
+                    "example": "id,userId,bookId,rating,review,createdAt\r\nabc123,u1,b1,5,Great book!,2025-07-16T12:00:00\r\n"
+                }
+            }
+        },
+        400: {
+            "description": "Bad request",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Bad request",
+                        "errors": [{"loc": ["query", "format"], "msg": "Input should be 'ndjson' or 'csv'", "type": "literal_error"}]
+                    }
+                }
+            }
+        }
+    },
+    name="exportReviews",
+)
+async def export_reviews(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format"),
+    type: Literal["review", "comment"] = Query("review", description="Which documents to export"),
+    bookId: Optional[str] = Query(None, min_length=1),
+    userId: Optional[str] = Query(None, min_length=1),
+    createdFrom: Optional[datetime] = Query(None, description="Inclusive lower bound on createdAt"),
+    createdTo: Optional[datetime] = Query(None, description="Exclusive upper bound on createdAt"),
+    batchSize: int = Query(1000, ge=1, le=10_000, description="Cursor batch size and rows per streamed chunk"),
+):
+    query = export_query(type, bookId=bookId, userId=userId, createdFrom=createdFrom, createdTo=createdTo)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_rows(app.storage.coll(type), query, type, format, batchSize),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{type}s.{format}"'},
+    )
 
 # ----- DELETE -----
 
@@ -1014,34 +2055,23 @@ async def remove_comment_by_id(body: CommentDeleteIn):
         )
 
     try:
-        doc = await app.db[COLL].find_one({"_id": _id, "type": "comment"})
-    except Exception:
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": "Internal server error while finding comment"},
-        )
-
-    if not doc:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Comment not found"})
-
-    if doc.get("userId") != body.userId:
-        return JSONResponse(
-            status_code=status.HTTP_403_FORBIDDEN,
-            content={"message": "Forbidden: comment belongs to a different user"},
+        deleted = await app.storage.coll("comment").find_one_and_delete(
+            {"_id": _id, "type": "comment", "userId": body.userId},
+            projection={"bookId": 1},
         )
-
-    try:
-        res = await app.db[COLL].delete_one({"_id": _id, "type": "comment"})
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"message": "Internal server error while deleting comment"},
         )
 
-    if res.deleted_count == 0:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Comment not found"})
+    if not deleted:
+        return await owner_mismatch_response(_id, "comment")
 
-    return {"message": f"Successfully deleted comment with id='{id}'"}
+    await touch_book(deleted["bookId"])
+    await app.feed_events.removed(body.id)
+
+    return {"message": f"Successfully deleted comment with id='{body.id}'"}
 
 @app.delete(
     "/reviews/{id}",
@@ -1103,21 +2133,265 @@ async def remove_comment_by_id(body: CommentDeleteIn):
 )
 async def remove_review_by_id(id: str):
     try:
-        res = await app.db[COLL].delete_one({"_id": oid(id), "type": "review"})
+        deleted = await app.storage.coll("review").find_one_and_delete({"_id": oid(id), "type": "review"})
     except Exception:
         return JSONResponse(
             status_code=500,
             content={"message": "Internal server error while deleting review"},
         )
 
-    if res.deleted_count == 0:
+    if not deleted:
         return JSONResponse(
             status_code=404,
             content={"message": "Review not found"},
         )
 
+    await update_rating_aggregate(deleted["bookId"], remove=deleted.get("rating"), created_at=deleted.get("createdAt"))
+    await app.feed_events.removed(str(deleted["_id"]))
+
     return {"message": f"Successfully deleted review with id='{id}'"}
 
+# ----- ADMIN -----
+
+@app.get(
+    "/admin/indexes",
+    description=(
+        "Reports how the indexes built on the reviews collection differ from the index manifest. "
+        "Missing indexes are created in the background at startup; mismatched and extra ones are only reported."
+    ),
+    summary="Index reconciliation report",
+    tags=["Admin"],
+    response_model=IndexReportOut,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Index report fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Index report fetched successfully",
+                        "data": {
+                            "status": "done",
+                            "missing": [],
+                            "mismatched": [],
+                            "extra": ["bookId_1"],
+                            "created": ["type_bookId_createdAt_id"],
+                            "errors": {}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="indexReport",
+)
+async def index_report():
+    return {
+        "message": "Index report fetched successfully",
+        "data": IndexReport(**app.index_report).model_dump(),
+    }
+
+@app.get(
+    "/admin/book-cache",
+    description="Hit and miss counters of the book-existence cache used to validate bookIds against book-service.",
+    summary="Book-existence cache counters",
+    tags=["Admin"],
+    response_model=BookCacheStatsOut,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Book cache stats fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Book cache stats fetched successfully",
+                        "data": {"hits": 9120, "misses": 311, "size": 287}
+                    }
+                }
+            }
+        }
+    },
+    name="bookCacheStats",
+)
+async def book_cache_stats():
+    return {
+        "message": "Book cache stats fetched successfully",
+        "data": BookCacheStats(**app.books.stats()).model_dump(),
+    }
+
+@app.get(
+    "/admin/response-cache",
+    description=(
+        "Counters of the response cache for the book review and comment listings: backend (memory or redis), hits and misses "
+        "of this worker, and for the memory backend the number and total size of the cached bodies."
+    ),
+    summary="Listing response cache counters",
+    tags=["Admin"],
+    response_model=ResponseCacheStatsOut,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Response cache stats fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Response cache stats fetched successfully",
+                        "data": {"backend": "memory", "hits": 48210, "misses": 530, "entries": 412, "bytes": 1830144}
+                    }
+                }
+            }
+        }
+    },
+    name="responseCacheStats",
+)
+async def response_cache_stats():
+    return {
+        "message": "Response cache stats fetched successfully",
+        "data": ResponseCacheStats(**app.cache.stats()).model_dump(exclude_none=True),
+    }
+
+@app.get(
+    "/admin/round-trips",
+    description=(
+        "Mongo round trips used per endpoint since startup: request count, total and maximum round trips, and the average. "
+        "Every response also carries the count for that request in the X-Mongo-Round-Trips header "
+        "(streamed bodies are read after the header is sent and are not included)."
+    ),
+    summary="Mongo round trips per endpoint",
+    tags=["Admin"],
+    response_model=RoundTripStatsOut,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Round trip stats fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Round trip stats fetched successfully",
+                        "data": {
+                            "newReview": {"requests": 120, "roundTrips": 240, "max": 2, "avg": 2.0},
+                            "changeStarRating": {"requests": 8, "roundTrips": 17, "max": 3, "avg": 2.12}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="roundTripStats",
+)
+async def round_trip_stats():
+    return {
+        "message": "Round trip stats fetched successfully",
+        "data": app.round_trips.snapshot(),
+    }
+
+@app.get(
+    "/admin/single-flight",
+    description=(
+        "Request coalescing per endpoint since startup: calls, reads actually executed, and calls that were served by "
+        "an identical read already in flight. Applies to the hot reads (reviews listing and average rating); "
+        "disabled with SINGLE_FLIGHT=0."
+    ),
+    summary="Coalesced reads per endpoint",
+    tags=["Admin"],
+    response_model=SingleFlightStatsOut,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Single-flight stats fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Single-flight stats fetched successfully",
+                        "data": {
+                            "allReviewsByBookId": {"calls": 500, "executions": 12, "coalesced": 488},
+                            "averageScoreForReview": {"calls": 40, "executions": 40, "coalesced": 0}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="singleFlightStats",
+)
+async def single_flight_stats():
+    return {
+        "message": "Single-flight stats fetched successfully",
+        "data": app.single_flight.snapshot(),
+    }
+
+@app.get(
+    "/debug/slow-queries",
+    description=(
+        "Mongo commands slower than SLOW_QUERY_MS since startup, grouped by query shape (the command with literal values "
+        "stripped) and ordered by total time. Shapes that were explained carry the winning plan's stages; COLLSCAN and "
+        "in-memory SORT are listed under `problems` and also logged as warnings."
+    ),
+    summary="Slowest Mongo query shapes",
+    tags=["Admin"],
+    response_model=SlowQueries,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Slow query shapes fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Slow query shapes fetched successfully",
+                        "data": {
+                            "thresholdMs": 100.0,
+                            "sampleRate": 0.1,
+                            "shapes": [
+                                {"command": "find", "collection": "reviews", "shape": {"filter": {"type": 1, "bookId": 1}, "sort": {"createdAt": -1}}, "count": 42, "totalMs": 9120.4, "maxMs": 480.2, "lastMs": 198.5, "lastSeen": "2025-07-20T09:14:03Z", "plan": ["SORT", "COLLSCAN"], "problems": ["COLLSCAN", "SORT"]}
+                            ]
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="slowQueries",
+)
+async def slow_queries(limit: int = Query(20, ge=1, le=200, description="Maximum number of shapes")):
+    return {
+        "message": "Slow query shapes fetched successfully",
+        "data": {
+            "thresholdMs": app.slow_queries.threshold_ms,
+            "sampleRate": app.slow_queries.sample,
+            "shapes": app.slow_queries.snapshot(limit),
+        },
+    }
+
+@app.get(
+    "/metrics",
+    description=(
+        "Prometheus metrics in the text exposition format: request latency per route, Mongo command latency, "
+        "outbound book-service request latency and event loop lag, all as histograms since startup."
+    ),
+    summary="Prometheus metrics",
+    tags=["Admin"],
+    response_class=Response,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Metrics in Prometheus text format",
+            "content": {
+                "text/plain": {
+                    "example": (
+                        "# HELP mongo_command_duration_seconds Mongo command round trip as reported by the driver.\n"
+                        "# TYPE mongo_command_duration_seconds histogram\n"
+                        "mongo_command_duration_seconds_bucket{command=\"find\",outcome=\"ok\",le=\"0.001\"} 412\n"
+                    )
+                }
+            }
+        }
+    },
+    name="metrics",
+)
+async def metrics():
+    return Response(app.metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 # ----- Helpers -----
 
 @app.exception_handler(RequestValidationError)
@@ -1130,12 +2404,105 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         },
     )
 
+def utcnow() -> datetime:
+    # naive UTC truncated to milliseconds, exactly what a later read from Mongo returns
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
 def oid(x: str) -> ObjectId:
     try:
         return ObjectId(x)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid id")
 
+async def owner_mismatch_response(_id: ObjectId, kind: str) -> JSONResponse:
+    # slow path only: the owner-filtered write matched nothing, tell 404 from 403
+    try:
+        exists = await app.storage.coll(kind).find_one({"_id": _id, "type": kind}, {"_id": 1})
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": f"Internal server error while finding {kind}"},
+        )
+    if not exists:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": f"{kind.capitalize()} not found"})
+    return JSONResponse(
+        status_code=status.HTTP_403_FORBIDDEN,
+        content={"message": f"Forbidden: {kind} belongs to a different user"},
+    )
+
+async def update_rating_aggregate(bookId: str, add: Optional[int] = None, remove: Optional[int] = None, genres: Optional[list] = None, created_at: Optional[datetime] = None):
+    # the review write already succeeded; a failed aggregate update is repaired by the periodic rebuild
+    try:
+        op = rating_update(bookId, add, remove, genres)
+        if op:
+            await app.storage.bulk_write({RATING_TYPE: [op], TREND_TYPE: trend_updates(bookId, created_at, add, remove)})
+    except Exception:
+        log.exception("failed to update rating aggregate for bookId=%s", bookId)
+    app.generations.forget(bookId)
+
+async def touch_book(bookId: str):
+    # invalidates the book's cached listings; the write itself already succeeded
+    try:
+        await bump_generation(app.storage.coll(RATING_TYPE), bookId)
+    except Exception:
+        log.exception("failed to bump cache generation for bookId=%s", bookId)
+    app.generations.forget(bookId)
+
+async def cached_listing(route: str, bookId: str, *params) -> tuple:
+    """`(key, body)` for a cached listing; body is None on a miss, key is None when
+    the book's generation could not be read and the cache must be bypassed."""
+    try:
+        gen = await app.generations.get(app.storage.coll(RATING_TYPE), bookId)
+    except Exception:
+        return None, None
+    key = cache_key(route, bookId, gen, *params)
+    return key, await app.cache.get(key)
+
+async def check_book(bookId: str) -> Optional[JSONResponse]:
+    try:
+        if await app.books.exists(bookId):
+            return None
+    except BookServiceError:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Error checking book existence in book-service"},
+        )
+    except BookServiceUnavailable:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Error connecting to book-service"},
+        )
+    return JSONResponse(
+        status_code=404,
+        content={"message": f"Book with id='{bookId}' not found"},
+    )
+
+async def book_validation(bookId: str) -> str:
+    """"verified" or "missing" as book-service answered, "unavailable" when it could not."""
+    try:
+        return "verified" if await app.books.exists(bookId) else "missing"
+    except (BookServiceError, BookServiceUnavailable):
+        return "unavailable"
+
+def invalid_fields_response(unknown: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={
+            "message": "Bad request",
+            "errors": [{"loc": ["query", "fields"], "msg": f"unknown field(s): {unknown}", "type": "value_error"}],
+        },
+    )
+
+def invalid_cursor_response(param: str = "after") -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={
+            "message": "Bad request",
+            "errors": [{"loc": ["query", param], "msg": "invalid cursor", "type": "value_error"}],
+        },
+    )
+
 def to_out(doc) -> ReviewOut:
     return ReviewOut(
         id=str(doc["_id"]),
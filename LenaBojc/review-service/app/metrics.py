@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from pymongo import monitoring
+
+# Prometheus metrics, rendered by hand in the text exposition format (0.0.4) so
+# the service needs no client library. Served on GET /metrics:
+#
+#   http_request_duration_seconds    per route template, method and status; time
+#                                    until the response headers are ready, so
+#                                    streamed bodies are not included
+#   mongo_command_duration_seconds   per Mongo command and outcome, as reported
+#                                    by the driver (round trip to the server)
+#   http_client_duration_seconds     outbound httpx requests per upstream, until
+#                                    the response headers arrive
+#   event_loop_lag_seconds           how late a periodic timer fires; anything
+#                                    above a few ms means blocking work on the loop
+#   write_batch_size                 documents per group-commit insert_many, and
+#   write_batch_flush_seconds        how long that write took (see batching.py)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per combination of label values.
+
+    Thread-safe: the Mongo listener observes from the driver's threads.
+    """
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for labels, (counts, total, count) in series:
+            plain = _labels(self.labelnames, labels)
+            for bound, n in zip(self.buckets, counts):
+                le = _labels(self.labelnames, labels, 'le="%s"' % _number(bound))
+                lines.append(f"{self.name}_bucket{le} {n}")
+            inf = _labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {count}")
+            lines.append(f"{self.name}_sum{plain} {_number(total)}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(self.value)}"]
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.histogram.observe(event.duration_micros / 1e6, event.command_name, "ok")
+
+    def failed(self, event):
+        self.histogram.observe(event.duration_micros / 1e6, event.command_name, "error")
+
+
+class Metrics:
+    """The service's metrics; one instance per app, rendered by GET /metrics."""
+
+    def __init__(self):
+        self.requests = Histogram(
+            "http_request_duration_seconds", "Time until the response headers are ready.", ("method", "route", "status"),
+        )
+        self.mongo_commands = Histogram(
+            "mongo_command_duration_seconds", "Mongo command round trip as reported by the driver.", ("command", "outcome"),
+        )
+        self.http_client = Histogram(
+            "http_client_duration_seconds", "Outbound HTTP request until the response headers arrive.", ("upstream", "method", "status"),
+        )
+        self.loop_lag = Histogram("event_loop_lag_seconds", "Delay of a periodic event loop timer.", buckets=LAG_BUCKETS)
+        self.loop_lag_last = Gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample.")
+        self.write_batch_size = Histogram("write_batch_size", "Documents per batched insert.", ("kind",), buckets=BATCH_SIZE_BUCKETS)
+        self.write_batch_flush = Histogram("write_batch_flush_seconds", "Duration of a batched insert.", ("kind",))
+        self.mongo = MongoCommandTimer(self.mongo_commands)
+
+    def http_hooks(self, upstreams: dict) -> dict:
+        """httpx `event_hooks` timing requests by upstream; `upstreams` maps base URLs to labels."""
+        prefixes = sorted(((str(url).rstrip("/"), label) for url, label in upstreams.items() if url), key=lambda p: -len(p[0]))
+
+        async def on_request(request):
+            request.extensions["metrics_started"] = time.perf_counter()
+
+        async def on_response(response):
+            started = response.request.extensions.get("metrics_started")
+            if started is None:
+                return
+            url = str(response.request.url)
+            upstream = next((label for prefix, label in prefixes if url.startswith(prefix)), "other")
+            self.http_client.observe(time.perf_counter() - started, upstream, response.request.method, str(response.status_code))
+
+        return {"request": [on_request], "response": [on_response]}
+
+    async def watch_loop_lag(self, interval: float = 0.5):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - scheduled, 0.0)
+            self.loop_lag.observe(lag)
+            self.loop_lag_last.set(lag)
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in (
+            self.requests, self.mongo_commands, self.http_client, self.loop_lag, self.loop_lag_last,
+            self.write_batch_size, self.write_batch_flush,
+        ):
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+from datetime import datetime, timezone
+import bson
+from pymongo import DeleteOne, ReplaceOne
+from .indexes import reconcile_layout
+from .storage import ENTITIES, split_name
+
+# Online migration from the shared collection to per-entity collections.
+#
+#   1. deploy with STORAGE_LAYOUT=dual; new writes now reach both layouts
+#   2. python -m app.migrate copy      copies every entity in _id order, in
+#                                      batches, checkpointed in <COLLECTION_NAME>_migration;
+#                                      rerun to resume, --restart to start over
+#   3. python -m app.migrate verify    compares counts and checksums per entity;
+#                                      --repair re-copies what differs
+#   4. deploy with STORAGE_LAYOUT=split
+#
+# A document that changes while its batch is being copied can land in the split
+# collection in its older state; verify finds it and --repair fixes it, so run
+# verify until it is clean before switching to split. The shared collection is
+# never modified.
+
+DEFAULT_BATCH = 1000
+
+
+def _key_filter(entity: str, doc: dict) -> dict:
+    return {"type": entity, **{f: doc.get(f) for f, _ in ENTITIES[entity]["key"]}}
+
+
+def _by_id(entity: str) -> bool:
+    return ENTITIES[entity]["key"] == (("_id", 1),)
+
+
+def _replacement(entity: str, doc: dict) -> dict:
+    # aggregates are matched by natural key and may already exist with another _id
+    return doc if _by_id(entity) else {k: v for k, v in doc.items() if k != "_id"}
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {k: _canonical(value[k]) for k in sorted(value)}
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def doc_hash(entity: str, doc: dict) -> bytes:
+    return hashlib.sha256(bson.encode(_canonical(_replacement(entity, doc)))).digest()
+
+
+def _compare(a: dict, b: dict, key) -> int:
+    for field, direction in key:
+        va, vb = a.get(field), b.get(field)
+        if va != vb:
+            return (-1 if va < vb else 1) * direction
+    return 0
+
+
+async def _next(cursor):
+    try:
+        return await cursor.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def copy_entity(source, dest, checkpoints, entity: str, batch_size: int = DEFAULT_BATCH, pause: float = 0.0, restart: bool = False) -> dict:
+    checkpoint = None if restart else await checkpoints.find_one({"_id": entity})
+    last = checkpoint.get("last") if checkpoint else None
+    copied = checkpoint.get("copied", 0) if checkpoint else 0
+    while True:
+        query = {"type": entity}
+        if last is not None:
+            query["_id"] = {"$gt": last}
+        docs = await source.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        await dest.bulk_write([ReplaceOne(_key_filter(entity, d), _replacement(entity, d), upsert=True) for d in docs], ordered=False)
+        last = docs[-1]["_id"]
+        copied += len(docs)
+        await checkpoints.update_one(
+            {"_id": entity},
+            {"$set": {"last": last, "copied": copied, "done": False, "updatedAt": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        if pause:
+            await asyncio.sleep(pause)
+    await checkpoints.update_one(
+        {"_id": entity},
+        {"$set": {"last": last, "copied": copied, "done": True, "updatedAt": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return {"entity": entity, "copied": copied}
+
+
+async def verify_entity(source, dest, entity: str, repair: bool = False, samples: int = 20) -> dict:
+    """Walks both collections in key order, comparing every document."""
+    key = ENTITIES[entity]["key"]
+    src = source.find({"type": entity}).sort(list(key)).__aiter__()
+    dst = dest.find({"type": entity}).sort(list(key)).__aiter__()
+    src_sum, dst_sum = hashlib.sha256(), hashlib.sha256()
+    report = {"entity": entity, "source": 0, "dest": 0, "missing": 0, "extra": 0, "different": 0, "samples": [], "repaired": 0}
+    found = []
+
+    def note(kind, doc):
+        report[kind] += 1
+        if len(report["samples"]) < samples:
+            report["samples"].append({"issue": kind, **{f: str(doc.get(f)) for f, _ in key}})
+        if repair:
+            found.append(doc)
+
+    async def flush(force=False):
+        # With dual writes live, a document can change after the cursors passed
+        # it, so every difference is repaired from the source's current state:
+        # deleted only when the source no longer has it, otherwise copied again
+        if not found or not (force or len(found) >= DEFAULT_BATCH):
+            return
+        fields = [f for f, _ in key]
+        current = {}
+        async for d in source.find({"$or": [_key_filter(entity, d) for d in found]}):
+            current[tuple(d.get(f) for f in fields)] = d
+        fixes = []
+        for doc in found:
+            fresh = current.get(tuple(doc.get(f) for f in fields))
+            if fresh is None:
+                fixes.append(DeleteOne(_key_filter(entity, doc)))
+            else:
+                fixes.append(ReplaceOne(_key_filter(entity, fresh), _replacement(entity, fresh), upsert=True))
+        found.clear()
+        await dest.bulk_write(fixes, ordered=False)
+        report["repaired"] += len(fixes)
+
+    a, b = await _next(src), await _next(dst)
+    while a is not None or b is not None:
+        order = -1 if b is None else 1 if a is None else _compare(a, b, key)
+        if order < 0:
+            report["source"] += 1
+            src_sum.update(doc_hash(entity, a))
+            note("missing", a)
+            a = await _next(src)
+        elif order > 0:
+            report["dest"] += 1
+            dst_sum.update(doc_hash(entity, b))
+            note("extra", b)
+            b = await _next(dst)
+        else:
+            report["source"] += 1
+            report["dest"] += 1
+            ha, hb = doc_hash(entity, a), doc_hash(entity, b)
+            src_sum.update(ha)
+            dst_sum.update(hb)
+            if ha != hb:
+                note("different", a)
+            a, b = await _next(src), await _next(dst)
+        await flush()
+    await flush(force=True)
+    report["sourceChecksum"] = src_sum.hexdigest()
+    report["destChecksum"] = dst_sum.hexdigest()
+    report["ok"] = report["missing"] == report["extra"] == report["different"] == 0
+    return report
+
+
+async def status(checkpoints) -> list:
+    return await checkpoints.find({}).sort("_id", 1).to_list(length=None)
+
+
+async def _main(argv):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(prog="python -m app.migrate", description="Copy the shared collection into per-entity collections.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    copy = sub.add_parser("copy")
+    copy.add_argument("--entity", choices=list(ENTITIES))
+    copy.add_argument("--batch-size", type=int, default=DEFAULT_BATCH)
+    copy.add_argument("--pause-ms", type=float, default=0, help="sleep between batches to limit load")
+    copy.add_argument("--restart", action="store_true", help="ignore checkpoints and copy everything again")
+    verify = sub.add_parser("verify")
+    verify.add_argument("--entity", choices=list(ENTITIES))
+    verify.add_argument("--repair", action="store_true")
+    sub.add_parser("status")
+    args = parser.parse_args(argv[1:])
+
+    load_dotenv()
+    base = os.getenv("COLLECTION_NAME")
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL"))
+    db = client[os.getenv("DB_NAME")]
+    source, checkpoints = db[base], db[f"{base}_migration"]
+    entities = [args.entity] if getattr(args, "entity", None) else list(ENTITIES)
+    failed = False
+    try:
+        if args.command == "status":
+            for cp in await status(checkpoints):
+                print(f"{cp['_id']}: copied {cp.get('copied', 0)}{' (done)' if cp.get('done') else ''}, last _id {cp.get('last')}")
+        for entity in entities if args.command != "status" else []:
+            dest = db[split_name(base, entity)]
+            if args.command == "copy":
+                # unique indexes first, so the copy cannot introduce duplicates
+                await reconcile_layout(db, {dest.name: [entity]})
+                result = await copy_entity(source, dest, checkpoints, entity, args.batch_size, args.pause_ms / 1000, args.restart)
+                print(f"{entity}: copied {result['copied']} into {dest.name}")
+            else:
+                r = await verify_entity(source, dest, entity, repair=args.repair)
+                print(
+                    f"{entity}: source {r['source']}, dest {r['dest']}, missing {r['missing']}, extra {r['extra']}, "
+                    f"different {r['different']}, checksums {'match' if r['sourceChecksum'] == r['destChecksum'] else 'differ'}"
+                    + (f", repaired {r['repaired']}" if args.repair else "")
+                )
+                for s in r["samples"]:
+                    print(f"  {s}")
+                failed = failed or (not r["ok"] and not args.repair)
+    finally:
+        client.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv)))
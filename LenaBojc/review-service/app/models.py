@@ -1,6 +1,6 @@
 from datetime import datetime
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
 
 # ----- IN -----
@@ -25,9 +25,11 @@ class RatingIn(BaseModel):
     rating: int = Field(..., ge=1, le=5, example=5)
     # review: Optional[str] = Field(None, min_length=1, max_length=10_000)
 
-class RetrieveReviewIn(BaseModel):
-    userId: str = Field(..., min_length=1, example="u1")
-    bookId: str = Field(..., min_length=1, example="b1")
+class AveragesIn(BaseModel):
+    bookIds: List[str] = Field(..., min_length=1, max_length=500, example=["b1", "b2"])
+
+class ReviewLookupIn(BaseModel):
+    bookIds: List[str] = Field(..., min_length=1, max_length=500, example=["b1", "b2"])
 
 class CommentDeleteIn(BaseModel):
     userId: str = Field(..., min_length=1, example="u1")
@@ -60,9 +62,84 @@ class CommentOut(BaseModel):
     def str_id(cls, v):
         return str(v)
 
+class RatingPrior(BaseModel):
+    mean: float
+    weight: float
+
+class RatingSummaryData(BaseModel):
+    bookId: str
+    count: int
+    mean: float
+    bayesian: float
+    histogram: Dict[str, int]
+    prior: RatingPrior
+
+class TrendPoint(BaseModel):
+    period: str
+    count: int
+    mean: float
+    histogram: Dict[str, int]
+
+class RatingTrendData(BaseModel):
+    bookId: str
+    bucket: str
+    items: List[TrendPoint]
+
+class TopBook(BaseModel):
+    rank: int
+    bookId: str
+    score: float
+    average: float
+    count: int
+    genres: List[str] = []
+
+class TopBooksData(BaseModel):
+    items: List[TopBook]
+
+class RecentItem(BaseModel):
+    type: str
+    id: str
+    userId: str
+    bookId: str
+    rating: Optional[int] = None
+    review: Optional[str] = None
+    comment: Optional[str] = None
+    createdAt: datetime
+
+class RecentData(BaseModel):
+    items: List[RecentItem]
+    count: int
+
+class SearchHit(BaseModel):
+    id: str
+    type: str
+    userId: str
+    bookId: str
+    rating: Optional[int] = None
+    snippet: str
+    score: float
+    createdAt: datetime
+
+class SearchResultsData(BaseModel):
+    items: List[SearchHit]
+    count: int
+    nextOffset: Optional[int] = None
+
 class AverageScoreData(BaseModel):
     average: float
 
+class BookAverage(BaseModel):
+    average: float
+    count: int
+
+class AveragesData(BaseModel):
+    items: Dict[str, BookAverage]
+    missing: List[str]
+
+class ReviewLookupData(BaseModel):
+    items: Dict[str, ReviewOut]
+    missing: List[str]
+
 # ----- CREATED -----
 
 class ReviewCreated(BaseModel):
@@ -84,6 +161,7 @@ class ReviewFetched(BaseModel):
 class ReviewsListData(BaseModel):
     items: List[ReviewOut]
     count: int
+    nextCursor: Optional[str] = None
 
 class ReviewsList(BaseModel):
     message: str
@@ -92,14 +170,130 @@ class ReviewsList(BaseModel):
 class CommentsListData(BaseModel):
     items: List[CommentOut]
     count: int
+    nextCursor: Optional[str] = None
 
 class CommentsList(BaseModel):
     message: str
     data: CommentsListData
 
+class RatingSummary(BaseModel):
+    message: str
+    data: RatingSummaryData
+
+class RatingTrend(BaseModel):
+    message: str
+    data: RatingTrendData
+
+class TopBooks(BaseModel):
+    message: str
+    data: TopBooksData
+
+class DiscussionCounts(BaseModel):
+    reviews: int
+    comments: int
+
+class DiscussionData(BaseModel):
+    reviews: ReviewsListData
+    comments: CommentsListData
+    counts: DiscussionCounts
+    rating: Optional[RatingSummaryData] = None
+
+class Discussion(BaseModel):
+    message: str
+    data: DiscussionData
+
+class Recent(BaseModel):
+    message: str
+    data: RecentData
+
+class SearchResults(BaseModel):
+    message: str
+    data: SearchResultsData
+
 class Msg(BaseModel):
     message: str
 
 class AverageScore(BaseModel):
     message: str
-    data: AverageScoreData
\ No newline at end of file
+    data: AverageScoreData
+
+class Averages(BaseModel):
+    message: str
+    data: AveragesData
+
+class ReviewLookup(BaseModel):
+    message: str
+    data: ReviewLookupData
+
+class IndexReport(BaseModel):
+    status: str
+    missing: List[str] = []
+    mismatched: List[Dict[str, Any]] = []
+    extra: List[str] = []
+    created: List[str] = []
+    errors: Dict[str, str] = {}
+    error: Optional[str] = None
+
+class IndexReportOut(BaseModel):
+    message: str
+    data: IndexReport
+
+class BookCacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int
+
+class BookCacheStatsOut(BaseModel):
+    message: str
+    data: BookCacheStats
+
+class ResponseCacheStats(BaseModel):
+    backend: str
+    hits: int
+    misses: int
+    entries: Optional[int] = None
+    bytes: Optional[int] = None
+
+class ResponseCacheStatsOut(BaseModel):
+    message: str
+    data: ResponseCacheStats
+
+class RouteRoundTrips(BaseModel):
+    requests: int
+    roundTrips: int
+    max: int
+    avg: float
+
+class RoundTripStatsOut(BaseModel):
+    message: str
+    data: Dict[str, RouteRoundTrips]
+
+class RouteSingleFlight(BaseModel):
+    calls: int
+    executions: int
+    coalesced: int
+
+class SingleFlightStatsOut(BaseModel):
+    message: str
+    data: Dict[str, RouteSingleFlight]
+
+class SlowQueryShape(BaseModel):
+    command: str
+    collection: Optional[str] = None
+    shape: Dict[str, Any]
+    count: int
+    totalMs: float
+    maxMs: float
+    lastMs: float
+    lastSeen: datetime
+    plan: Optional[List[str]] = None
+    problems: List[str] = []
+
+class SlowQueriesData(BaseModel):
+    thresholdMs: float
+    sampleRate: float
+    shapes: List[SlowQueryShape]
+
+class SlowQueries(BaseModel):
+    message: str
+    data: SlowQueriesData
@@ -0,0 +1,104 @@
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from pathlib import Path
+from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
+from fastapi.responses import Response
+
+log = logging.getLogger("review-service.openapi")
+
+# Build-time OpenAPI snapshot. FastAPI builds the schema on the first
+# /openapi.json request, in every worker; with the route examples in main.py
+# that is tens of milliseconds spent during a cold start. The Docker build runs
+#
+#   python -m app.openapi build
+#
+# which writes the schema next to this file, together with a digest of the
+# app's sources. install() serves that file as static bytes. Without a snapshot,
+# or when the sources no longer match its digest (a local build that went stale),
+# the schema is built once on the first request and served from memory after.
+
+SNAPSHOT = Path(__file__).with_name("openapi.json")
+DIGEST = SNAPSHOT.with_suffix(".json.sha256")
+
+
+def source_digest(package_dir: Path = SNAPSHOT.parent) -> str:
+    h = hashlib.sha256()
+    for path in sorted(package_dir.glob("*.py")):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def render(app) -> bytes:
+    return json.dumps(app.openapi(), separators=(",", ":")).encode()
+
+
+def write_snapshot(app, path: Path = SNAPSHOT) -> int:
+    body = render(app)
+    path.write_bytes(body)
+    path.with_suffix(".json.sha256").write_text(source_digest() + "\n")
+    return len(body)
+
+
+def load_snapshot(path: Path = SNAPSHOT):
+    """The snapshot bytes, or None when there is none or it no longer matches the sources."""
+    try:
+        body = path.read_bytes()
+        digest = path.with_suffix(".json.sha256").read_text().strip()
+    except FileNotFoundError:
+        return None
+    if digest != source_digest():
+        log.warning("OpenAPI snapshot %s is stale, building the schema instead", path)
+        return None
+    return body
+
+
+def install(app, url: str = "/openapi.json", path: Path = SNAPSHOT):
+    """Serves the schema at `url`, plus /docs and /redoc pointing at it.
+
+    The app must be created with openapi_url=None so FastAPI does not register
+    its own schema and docs routes.
+    """
+    cached = []
+
+    async def openapi_json():
+        if not cached:
+            cached.append(load_snapshot(path) or render(app))
+        return Response(cached[0], media_type="application/json")
+
+    async def swagger_ui():
+        return get_swagger_ui_html(openapi_url=url, title=f"{app.title} - Swagger UI")
+
+    async def redoc():
+        return get_redoc_html(openapi_url=url, title=f"{app.title} - ReDoc")
+
+    app.add_api_route(url, openapi_json, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/docs", swagger_ui, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/redoc", redoc, methods=["GET"], include_in_schema=False)
+
+
+def _main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.openapi", description="Write the OpenAPI snapshot served by the app.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("--out", type=Path, default=SNAPSHOT)
+    check = sub.add_parser("check", help="exit 1 if the snapshot is missing or stale")
+    check.add_argument("--path", type=Path, default=SNAPSHOT)
+    args = parser.parse_args(argv[1:])
+
+    if args.command == "check":
+        ok = load_snapshot(args.path) is not None
+        print(f"{args.path}: {'up to date' if ok else 'missing or stale'}")
+        return 0 if ok else 1
+    from .main import app
+
+    size = write_snapshot(app, args.out)
+    print(f"wrote {args.out} ({size} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv))
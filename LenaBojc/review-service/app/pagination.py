@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+
+# Keyset pagination over (createdAt, _id), newest first. The cursor is opaque to
+# clients: base64url encoded JSON of the last item on the previous page.
+
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps({"t": doc["createdAt"].isoformat(), "id": str(doc["_id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Returns `(createdAt, _id)`; raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+def after_filter(cursor: str) -> dict:
+    created_at, _id = decode_cursor(cursor)
+    return {"$or": [
+        {"createdAt": {"$lt": created_at}},
+        {"createdAt": created_at, "_id": {"$lt": _id}},
+    ]}
+
+
+SORT = [("createdAt", -1), ("_id", -1)]
+
+
+def split_page(docs: list, limit: int):
+    """`docs` holds up to limit + 1 items; returns `(docs, nextCursor)`."""
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1])
+    return docs, None
+
+
+async def fetch_page(coll, query: dict, limit: int, after: str = None, projection=None):
+    """Returns `(docs, nextCursor)` for one page sorted by SORT."""
+    if after:
+        query = {**query, **after_filter(after)}
+    cursor = coll.find(query, projection).sort(SORT).limit(limit + 1)
+    docs = await cursor.to_list(length=limit + 1)
+    return split_page(docs, limit)
+
+
+def page_pipeline(query: dict, limit: int, after: str = None, projection=None) -> list:
+    """Aggregation stages selecting the same page as fetch_page, e.g. for one branch of a $facet."""
+    if after:
+        query = {**query, **after_filter(after)}
+    stages = [{"$match": query}, {"$sort": dict(SORT)}, {"$limit": limit + 1}]
+    if projection:
+        stages.append({"$project": projection})
+    return stages
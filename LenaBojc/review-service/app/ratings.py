@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import UpdateOne
+
+# Per-book rating aggregates are documents of type "bookRating" (next to the
+# reviews, or in their own collection, see storage.py):
+# {bookId, sum, count, hist: {"1".."5": n}, score, genres, gen}.
+# `gen` is the book's cache generation, see cache.py. Writes
+# keep them current with an update pipeline that adds the deltas and recomputes
+# the Bayesian `score` in the same atomic write, so the (type, score) index is
+# always a sorted leaderboard. `python -m app.ratings rebuild` recomputes them
+# from scratch, next to live writes (see guarded_write()).
+
+log = logging.getLogger("review-service.ratings")
+
+RATING_TYPE = "bookRating"
+STARS = range(1, 6)
+
+# Bayesian smoothing: every book starts with PRIOR_WEIGHT virtual ratings of PRIOR_MEAN.
+PRIOR_MEAN = float(os.getenv("RATING_PRIOR_MEAN", "3.0"))
+PRIOR_WEIGHT = float(os.getenv("RATING_PRIOR_WEIGHT", "10"))
+
+
+def _valid(rating) -> bool:
+    return isinstance(rating, int) and rating in STARS
+
+
+def rating_inc(add: Optional[int] = None, remove: Optional[int] = None) -> dict:
+    """$inc document that adds one rating and/or removes another."""
+    inc = {}
+    if _valid(add):
+        inc["sum"] = inc.get("sum", 0) + add
+        inc["count"] = inc.get("count", 0) + 1
+        inc[f"hist.{add}"] = inc.get(f"hist.{add}", 0) + 1
+    if _valid(remove):
+        inc["sum"] = inc.get("sum", 0) - remove
+        inc["count"] = inc.get("count", 0) - 1
+        inc[f"hist.{remove}"] = inc.get(f"hist.{remove}", 0) - 1
+    return {k: v for k, v in inc.items() if v}
+
+
+def _score_expr() -> dict:
+    return {"$cond": [
+        {"$gt": [{"$add": [PRIOR_WEIGHT, "$count"]}, 0]},
+        {"$divide": [{"$add": [PRIOR_MEAN * PRIOR_WEIGHT, "$sum"]}, {"$add": [PRIOR_WEIGHT, "$count"]}]},
+        PRIOR_MEAN,
+    ]}
+
+
+def rating_pipeline(inc: dict, now: datetime, genres: Optional[list] = None) -> list:
+    """Update pipeline equivalent of `{"$inc": inc}` that also keeps `score` current."""
+    step = {k: {"$add": [{"$ifNull": [f"${k}", 0]}, v]} for k, v in {**inc, "gen": 1}.items()}
+    step["updatedAt"] = now
+    if genres is not None:
+        step["genres"] = {"$literal": list(genres)}
+    return [{"$set": step}, {"$set": {"score": _score_expr()}}]
+
+
+def rating_update(book_id: str, add: Optional[int] = None, remove: Optional[int] = None, genres: Optional[list] = None, now: Optional[datetime] = None) -> Optional[UpdateOne]:
+    """The aggregate write for one changed review, or None when nothing changes."""
+    inc = rating_inc(add, remove)
+    if not inc:
+        return None
+    return UpdateOne(
+        {"type": RATING_TYPE, "bookId": book_id},
+        rating_pipeline(inc, now or datetime.now(timezone.utc), genres),
+        upsert=True,
+    )
+
+
+async def apply_rating_change(coll, book_id: str, add: Optional[int] = None, remove: Optional[int] = None, genres: Optional[list] = None):
+    op = rating_update(book_id, add, remove, genres)
+    if op:
+        await coll.bulk_write([op])
+
+
+def rating_batch_ops(added: dict, genres: Optional[dict] = None, touched=(), now: Optional[datetime] = None) -> list:
+    """Aggregate writes for many new ratings; `added` maps bookId to a list of ratings,
+    `genres` optionally maps bookId to the book's genres. Books in `touched`
+    without new ratings only get their cache generation bumped."""
+    genres = genres or {}
+    now = now or datetime.now(timezone.utc)
+    ops = []
+    for book_id, ratings in added.items():
+        inc = {}
+        for r in ratings:
+            for k, v in rating_inc(add=r).items():
+                inc[k] = inc.get(k, 0) + v
+        if inc:
+            ops.append(UpdateOne(
+                {"type": RATING_TYPE, "bookId": book_id},
+                rating_pipeline(inc, now, genres.get(book_id)),
+                upsert=True,
+            ))
+    for book_id in set(touched) - set(added):
+        ops.append(UpdateOne({"type": RATING_TYPE, "bookId": book_id}, {"$inc": {"gen": 1}}, upsert=True))
+    return ops
+
+
+async def apply_rating_batch(coll, added: dict, genres: Optional[dict] = None, touched=()):
+    ops = rating_batch_ops(added, genres, touched)
+    if ops:
+        await coll.bulk_write(ops, ordered=False)
+
+
+def average_of(doc: Optional[dict]) -> Optional[float]:
+    if not doc or doc.get("count", 0) <= 0:
+        return None
+    return round(doc["sum"] / doc["count"], 2)
+
+
+def bayesian_score(total: float, count: int, prior_mean: float = PRIOR_MEAN, prior_weight: float = PRIOR_WEIGHT) -> float:
+    if count + prior_weight <= 0:
+        return prior_mean
+    return (prior_mean * prior_weight + total) / (prior_weight + count)
+
+
+def summary_of(doc: Optional[dict], prior_mean: float = PRIOR_MEAN, prior_weight: float = PRIOR_WEIGHT) -> Optional[dict]:
+    if not doc or doc.get("count", 0) <= 0:
+        return None
+    hist = doc.get("hist", {})
+    return {
+        "bookId": doc["bookId"],
+        "count": doc["count"],
+        "mean": round(doc["sum"] / doc["count"], 2),
+        "bayesian": round(bayesian_score(doc["sum"], doc["count"], prior_mean, prior_weight), 2),
+        "histogram": {str(s): max(hist.get(str(s), 0), 0) for s in STARS},
+        "prior": {"mean": prior_mean, "weight": prior_weight},
+    }
+
+
+async def versions(coll, query: dict, key_fields, extra=()) -> dict:
+    """`updatedAt` (plus `extra` fields) of every existing aggregate, by key.
+
+    Read before a rebuild scans the reviews, so its writes can be guarded by
+    guarded_write().
+    """
+    projection = {"_id": 0, "updatedAt": 1, **{f: 1 for f in key_fields}, **{f: 1 for f in extra}}
+    out = {}
+    async for doc in coll.find(query, projection):
+        out[tuple(doc.get(f) for f in key_fields)] = doc
+    return out
+
+
+def guarded_write(filter: dict, prev: Optional[dict], values: dict) -> UpdateOne:
+    """Compare-and-set write of recomputed aggregate values.
+
+    An existing aggregate is only written when its `updatedAt` still matches what
+    versions() read; every live write changes `updatedAt`, so an increment that
+    lands while the rebuild runs is never overwritten (that document is skipped
+    and corrected by the next rebuild). A missing one is only created, never
+    replaced, in case a live write created it in the meantime; that write may
+    predate the scan or not, so the document is skipped too rather than retried.
+    """
+    if prev is None:
+        return UpdateOne(filter, {"$setOnInsert": {**values, "gen": 1}}, upsert=True)
+    return UpdateOne({**filter, "updatedAt": prev.get("updatedAt")}, {"$set": values, "$inc": {"gen": 1}})
+
+
+async def flush_guarded(coll, ops: list) -> int:
+    """Writes guarded_write() ops and returns how many were skipped."""
+    if not ops:
+        return 0
+    result = await coll.bulk_write(ops, ordered=False)
+    # a guarded $set always modifies (it bumps gen); a $setOnInsert that found a
+    # document created by a live write matches without modifying anything
+    return len(ops) - result.modified_count - result.upserted_count
+
+
+async def _backfill_genres(books, book_ids, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch(book_id):
+        async with sem:
+            try:
+                return await books.genres(book_id)
+            except Exception as e:
+                log.warning("could not fetch genres of bookId=%s: %s", book_id, e)
+                return None
+
+    found = await asyncio.gather(*(fetch(b) for b in book_ids))
+    return {b: g for b, g in zip(book_ids, found) if g is not None}
+
+
+async def rebuild_ratings(reviews, ratings, books=None, genre_lookups: int = 10) -> dict:
+    """Recomputes every bookRating document from the reviews themselves.
+
+    Safe to run next to live writes, see guarded_write(). Aggregates of books
+    that no longer have any reviews are zeroed, not deleted. With `books` (a
+    BookClient), aggregates without genres get them from book-service.
+    """
+    stamp = datetime.now(timezone.utc)
+    prev = await versions(ratings, {"type": RATING_TYPE}, ("bookId",), ("genres",))
+    pipeline = [
+        {"$match": {"type": "review", "rating": {"$gte": 1, "$lte": 5}}},
+        {"$group": {
+            "_id": "$bookId",
+            "sum": {"$sum": "$rating"},
+            "count": {"$sum": 1},
+            **{f"h{s}": {"$sum": {"$cond": [{"$eq": ["$rating", s]}, 1, 0]}} for s in STARS},
+        }},
+    ]
+    rebuilt = skipped = 0
+
+    async def flush(rows):
+        nonlocal rebuilt, skipped
+        old = {row["_id"]: prev.pop((row["_id"],), None) for row in rows}
+        missing = [b for b, doc in old.items() if books is not None and "genres" not in (doc or {})]
+        genres = await _backfill_genres(books, missing, genre_lookups) if missing else {}
+        ops = []
+        for row in rows:
+            values = {
+                "sum": row["sum"],
+                "count": row["count"],
+                "hist": {str(s): row[f"h{s}"] for s in STARS},
+                "score": bayesian_score(row["sum"], row["count"]),
+                "updatedAt": stamp,
+            }
+            if row["_id"] in genres:
+                values["genres"] = genres[row["_id"]]
+            ops.append(guarded_write({"type": RATING_TYPE, "bookId": row["_id"]}, old[row["_id"]], values))
+        missed = await flush_guarded(ratings, ops)
+        rebuilt += len(ops) - missed
+        skipped += missed
+
+    rows = []
+    async for row in reviews.aggregate(pipeline, allowDiskUse=True):
+        rows.append(row)
+        if len(rows) >= 1000:
+            await flush(rows)
+            rows = []
+    await flush(rows)
+
+    # what is left has no reviews any more
+    zero = {"sum": 0, "count": 0, "hist": {str(s): 0 for s in STARS}, "score": bayesian_score(0, 0), "updatedAt": stamp}
+    ops = [guarded_write({"type": RATING_TYPE, "bookId": key[0]}, doc, zero) for key, doc in prev.items()]
+    zero_skipped = 0
+    for i in range(0, len(ops), 1000):
+        zero_skipped += await flush_guarded(ratings, ops[i:i + 1000])
+    return {"books": rebuilt, "zeroed": len(ops) - zero_skipped, "skipped": skipped + zero_skipped}
+
+
+async def _main(argv):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from .books import BookClient
+    from .storage import Storage
+
+    if argv[1:] != ["rebuild"]:
+        print("usage: python -m app.ratings rebuild", file=sys.stderr)
+        return 2
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL"))
+    books = BookClient(os.getenv("BOOKS_API_URL")) if os.getenv("BOOKS_API_URL") else None
+    try:
+        storage = Storage(client[os.getenv("DB_NAME")], os.getenv("COLLECTION_NAME"))
+        result = await rebuild_ratings(storage.coll("review"), storage.coll(RATING_TYPE), books)
+    finally:
+        client.close()
+        if books is not None:
+            await books.aclose()
+    print(f"rebuilt {result['books']} book ratings, zeroed {result['zeroed']}, skipped {result['skipped']} changed while rebuilding")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv)))
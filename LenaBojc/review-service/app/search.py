@@ -0,0 +1,60 @@
+import html
+import re
+
+# Full-text search over review and comment text, backed by the
+# "review_comment_text" Mongo text index. Mongo does the matching, stemming
+# and relevance scoring; this module builds the query and the snippets.
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_TERM = re.compile(r'-?"[^"]*"|-?\S+')
+
+
+def search_terms(q: str) -> list:
+    """Lower-cased words of the query, leaving out negated terms."""
+    terms = []
+    for tok in _TERM.findall(q):
+        if tok.startswith("-"):
+            continue
+        terms.extend(w.lower() for w in _WORD.findall(tok))
+    return list(dict.fromkeys(terms))
+
+
+def search_query(q: str, kinds: list, bookId: str = None) -> dict:
+    query = {"$text": {"$search": q}, "type": {"$in": kinds}}
+    if bookId:
+        query["bookId"] = bookId
+    return query
+
+
+def _prefix(term: str) -> str:
+    # crude stand-in for the index's stemmer: "running" should highlight "run", "runs"
+    return term if len(term) <= 4 else term[:max(4, len(term) - 3)]
+
+
+def snippet(text: str, terms: list, width: int = 160) -> str:
+    """HTML-escaped excerpt around the first matching word, matches wrapped in <mark>."""
+    if not text:
+        return ""
+    prefixes = [_prefix(t) for t in terms]
+    matches = [m for m in _WORD.finditer(text) if any(m.group().lower().startswith(p) for p in prefixes)]
+
+    start = 0
+    if matches and matches[0].start() > width // 3:
+        start = matches[0].start() - width // 3
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+    end = min(len(text), start + width)
+    while end < len(text) and not text[end].isspace():
+        end += 1
+
+    out, pos = [], start
+    for m in matches:
+        if m.start() < start:
+            continue
+        if m.end() > end:
+            break
+        out.append(html.escape(text[pos:m.start()]))
+        out.append(f"<mark>{html.escape(m.group())}</mark>")
+        pos = m.end()
+    out.append(html.escape(text[pos:end]))
+    return ("…" if start > 0 else "") + "".join(out) + ("…" if end < len(text) else "")
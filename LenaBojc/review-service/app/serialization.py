@@ -0,0 +1,95 @@
+import json
+import os
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+# Fast path for read endpoints: documents are projected to the output fields in
+# Mongo, shaped into plain dicts and encoded once by pydantic-core. Routes keep
+# their response_model, so the OpenAPI schema does not change; FastAPI just does
+# not validate a Response it is handed. FAST_SERIALIZATION=0 returns the dicts
+# instead and lets FastAPI validate them against response_model as before.
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "1") != "0"
+
+REVIEW_PROJECTION = {"userId": 1, "bookId": 1, "rating": 1, "review": 1, "createdAt": 1}
+COMMENT_PROJECTION = {"userId": 1, "bookId": 1, "comment": 1, "createdAt": 1}
+
+# Sparse fieldsets: `?fields=rating,createdAt` narrows the projection and the
+# output to those fields plus `id`. A sparse body does not match the route's
+# response_model, so it is always sent encoded, whatever FAST_SERIALIZATION says.
+REVIEW_FIELDS = ("id", "userId", "bookId", "rating", "review", "createdAt")
+COMMENT_FIELDS = ("id", "userId", "bookId", "comment", "createdAt")
+
+
+def parse_fields(fields: str, allowed: tuple):
+    """The requested fields in canonical order, or None for all of them.
+
+    Raises ValueError listing the unknown names.
+    """
+    if fields is None:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = sorted(wanted - set(allowed))
+    if unknown:
+        raise ValueError(", ".join(unknown))
+    return tuple(f for f in allowed if f in wanted or f == "id")
+
+
+def fields_projection(fields: tuple, always=()) -> dict:
+    """Mongo projection for `fields`; `always` lists fields the route itself needs, e.g. for cursors."""
+    return {f: 1 for f in (*fields, *always) if f != "id"}
+
+
+def sparse_dict(doc: dict, fields: tuple) -> dict:
+    out = {}
+    for f in fields:
+        if f == "id":
+            out["id"] = str(doc["_id"])
+        elif doc.get(f) is not None:
+            out[f] = doc[f]
+    return out
+
+
+def review_dict(doc: dict, exclude_none: bool = False) -> dict:
+    out = {
+        "id": str(doc["_id"]),
+        "userId": doc["userId"],
+        "bookId": doc["bookId"],
+        "rating": doc["rating"],
+        "review": doc.get("review", ""),
+        "createdAt": doc["createdAt"],
+    }
+    if exclude_none and out["review"] is None:
+        del out["review"]
+    return out
+
+
+def comment_dict(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "userId": doc["userId"],
+        "bookId": doc["bookId"],
+        "comment": doc["comment"],
+        "createdAt": doc["createdAt"],
+    }
+
+
+def respond(content: dict, status_code: int = 200, headers: dict = None, raw: bool = False):
+    """`status_code` must match the route's own, which applies when the dict is returned.
+    `headers` only reach the client on the fast path; routes that send headers
+    also set them on their injected Response for the dict path. `raw` forces the
+    fast path, e.g. for sparse fieldsets."""
+    if not FAST_SERIALIZATION and not raw:
+        return content
+    return Response(to_json(content), status_code, headers=headers, media_type="application/json")
+
+
+def encode(content: dict) -> bytes:
+    return to_json(content)
+
+
+def respond_encoded(body: bytes, status_code: int = 200, headers: dict = None, raw: bool = False):
+    """Like respond() for a body that is already encoded, e.g. one from the response cache."""
+    if not FAST_SERIALIZATION and not raw:
+        return json.loads(body)
+    return Response(body, status_code, headers=headers, media_type="application/json")
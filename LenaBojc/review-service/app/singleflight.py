@@ -0,0 +1,49 @@
+import asyncio
+import os
+
+# Request coalescing for hot reads. While a read for a key is in flight, identical
+# reads wait for its result instead of querying Mongo (and book-service) again.
+# Only data is shared; every request still builds its own response from it, and
+# callers must not mutate what they get back. A read that starts while another
+# is in flight may see a result up to one query old. SINGLE_FLIGHT=0 turns it off.
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") != "0"
+
+
+class SingleFlight:
+    """Concurrent `do()` calls with the same key share one execution of `fn`.
+
+    The first element of the key names the route and groups the counters.
+    """
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT):
+        self.enabled = enabled
+        self.routes = {}
+        self._inflight = {}
+
+    async def do(self, key: tuple, fn):
+        stats = self.routes.setdefault(key[0], {"calls": 0, "executions": 0, "coalesced": 0})
+        stats["calls"] += 1
+        if not self.enabled:
+            stats["executions"] += 1
+            return await fn()
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            stats["executions"] += 1
+            pending = asyncio.ensure_future(fn())
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda f: self._done(key, f))
+        else:
+            stats["coalesced"] += 1
+        # shielded: a waiter that goes away does not cancel the read for the others
+        return await asyncio.shield(pending)
+
+    def _done(self, key: tuple, fut: asyncio.Future):
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        if not fut.cancelled():
+            fut.exception()  # retrieved here so abandoned reads do not log warnings
+
+    def snapshot(self) -> dict:
+        return {route: dict(s) for route, s in sorted(self.routes.items())}
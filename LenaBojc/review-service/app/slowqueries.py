@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from pymongo import monitoring
+
+log = logging.getLogger("review-service.slowqueries")
+
+# Slow-query log. Any Mongo command slower than SLOW_QUERY_MS is logged and
+# counted per query shape: the command with every literal value replaced by 1,
+# so find({"type": "review", "bookId": "b1"}) and ("b2") are one shape. For a
+# SLOW_QUERY_EXPLAIN_SAMPLE fraction of slow commands (at most once a minute per
+# shape) the command is explained on the event loop, and a COLLSCAN or in-memory
+# SORT in the winning plan is logged as a structured warning. GET
+# /debug/slow-queries lists the worst shapes. SLOW_QUERY_MS=0 turns it off.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+
+EXPLAINABLE = ("find", "aggregate", "count", "distinct", "findAndModify", "update", "delete")
+MAX_SHAPES = 200
+EXPLAIN_INTERVAL = 60.0
+
+# fields the driver adds to a command that explain does not accept
+_DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+def _shape(value):
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return [_shape(v) for v in value]
+    return 1
+
+
+def _pipeline_shape(pipeline) -> list:
+    stages = []
+    for stage in pipeline or []:
+        if not isinstance(stage, dict) or not stage:
+            continue
+        name, spec = next(iter(stage.items()))
+        stages.append({name: spec if name == "$sort" else _shape(spec) if name == "$match" else 1})
+    return stages
+
+
+def query_shape(name: str, command: dict) -> dict:
+    """The parts of a command that decide its plan, with literal values stripped."""
+    if name == "find":
+        shape = {"filter": _shape(command.get("filter", {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if name == "aggregate":
+        return {"pipeline": _pipeline_shape(command.get("pipeline"))}
+    if name in ("count", "distinct"):
+        return {"filter": _shape(command.get("query") or {})}
+    if name == "findAndModify":
+        shape = {"filter": _shape(command.get("query") or {})}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if name in ("update", "delete"):
+        statements = command.get("updates" if name == "update" else "deletes") or [{}]
+        return {"filter": _shape(statements[0].get("q") or {})}
+    return {}
+
+
+def explain_command(command: dict) -> dict:
+    cmd = {k: v for k, v in command.items() if not k.startswith("$") and k not in _DRIVER_FIELDS}
+    # explain takes a single update or delete statement
+    for key in ("updates", "deletes"):
+        if cmd.get(key):
+            cmd[key] = list(cmd[key])[:1]
+    return cmd
+
+
+def winning_stages(explain: dict) -> list:
+    """Stage names of the winning plan; aggregation $sort stages count as SORT."""
+    stages = []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            if in_plan and isinstance(node.get("stage"), str):
+                stages.append(node["stage"])
+            for k, v in node.items():
+                if k in ("rejectedPlans", "command"):
+                    continue
+                if k == "stages" and isinstance(v, list):
+                    # aggregation stages that could not be pushed into the query plan
+                    stages.extend("SORT" for stage in v if isinstance(stage, dict) and "$sort" in stage)
+                walk(v, in_plan or k == "winningPlan")
+        elif isinstance(node, list):
+            for v in node:
+                walk(v, in_plan)
+
+    walk(explain, False)
+    return stages
+
+
+def plan_problems(stages: list) -> list:
+    return [p for p in ("COLLSCAN", "SORT") if p in stages]
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Command listener recording slow commands per shape; runs on the driver's threads."""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, sample: float = SLOW_QUERY_EXPLAIN_SAMPLE):
+        self.threshold_ms = threshold_ms
+        self.sample = sample
+        self.shapes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop, client):
+        """Enables explains, which run as tasks on `loop` through `client`."""
+        self._loop = loop
+        self._client = client
+
+    def started(self, event):
+        if self.threshold_ms <= 0:
+            return
+        if event.command_name in EXPLAINABLE or event.command_name == "getMore":
+            with self._lock:
+                self._pending[(event.connection_id, event.request_id)] = (event.command, event.database_name)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        if self.threshold_ms <= 0:
+            return
+        with self._lock:
+            command, db_name = self._pending.pop((event.connection_id, event.request_id), (None, None))
+        ms = event.duration_micros / 1000
+        if ms < self.threshold_ms or command is None:
+            return
+        name = event.command_name
+        if name == "getMore" and "maxTimeMS" in command:
+            return  # tailable awaitData cursors wait on purpose
+        collection = command.get("collection") if name == "getMore" else command.get(name)
+        shape = query_shape(name, command)
+        key = json.dumps([name, collection, shape], default=str)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.shapes.get(key)
+            if entry is None:
+                if len(self.shapes) >= MAX_SHAPES:
+                    del self.shapes[min(self.shapes, key=lambda k: self.shapes[k]["totalMs"])]
+                entry = self.shapes[key] = {
+                    "command": name, "collection": collection, "shape": shape,
+                    "count": 0, "totalMs": 0.0, "maxMs": 0.0, "lastMs": 0.0,
+                    "plan": None, "problems": [], "_explainedAt": None,
+                }
+            entry["count"] += 1
+            entry["totalMs"] += ms
+            entry["maxMs"] = max(entry["maxMs"], ms)
+            entry["lastMs"] = ms
+            entry["lastSeen"] = datetime.now(timezone.utc)
+            explain = (
+                self._loop is not None
+                and name in EXPLAINABLE
+                and random.random() < self.sample
+                and (entry["_explainedAt"] is None or now - entry["_explainedAt"] >= EXPLAIN_INTERVAL)
+            )
+            if explain:
+                entry["_explainedAt"] = now
+        log.warning("slow mongo command %s on %s took %.1f ms: %s", name, collection, ms, json.dumps(shape, default=str))
+        if explain:
+            cmd = explain_command(command)
+            try:
+                self._loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._explain(key, db_name, cmd, ms)))
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+    async def _explain(self, key: str, db_name: str, command: dict, ms: float):
+        try:
+            result = await self._client[db_name].command({"explain": command, "verbosity": "queryPlanner"})
+        except Exception:
+            log.warning("explain of a slow mongo command failed", exc_info=True)
+            return
+        stages = winning_stages(result)
+        problems = plan_problems(stages)
+        name, collection, shape = json.loads(key)
+        with self._lock:
+            entry = self.shapes.get(key)
+            if entry is not None:
+                entry["plan"] = stages
+                entry["problems"] = problems
+        if problems:
+            log.warning(json.dumps({
+                "event": "slow_query_plan",
+                "problems": problems,
+                "plan": stages,
+                "command": name,
+                "collection": collection,
+                "shape": shape,
+                "ms": round(ms, 1),
+            }))
+
+    def snapshot(self, limit: int = 20) -> list:
+        with self._lock:
+            entries = sorted(self.shapes.values(), key=lambda e: e["totalMs"], reverse=True)[:limit]
+            return [
+                {k: round(v, 1) if k.endswith("Ms") else v for k, v in e.items() if not k.startswith("_")}
+                for e in entries
+            ]
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+log = logging.getLogger("review-service.storage")
+
+# Where each entity lives. Documents always keep their `type`, so queries are the
+# same in every layout; only the collection they run against changes.
+#
+#   shared  everything in COLLECTION_NAME, told apart by `type` (the original layout)
+#   split   one collection per entity, named "<COLLECTION_NAME>_<suffix>"
+#   dual    cutover: reads from the shared collection, every write goes to the
+#           shared collection first and is then mirrored to the split one
+#
+# Moving from shared to split: deploy with dual, run `python -m app.migrate copy`
+# and `verify`, then deploy with split. See migrate.py.
+
+STORAGE_LAYOUT = os.getenv("STORAGE_LAYOUT", "shared")
+LAYOUTS = ("shared", "split", "dual")
+
+# entity -> collection suffix in the split layout, and the fields that identify
+# one document (aggregates are upserted by their natural key, so their _id can
+# differ between layouts)
+ENTITIES = {
+    "review": {"suffix": "reviews", "key": (("_id", 1),)},
+    "comment": {"suffix": "comments", "key": (("_id", 1),)},
+    "bookRating": {"suffix": "bookRatings", "key": (("bookId", 1),)},
+    "ratingTrend": {"suffix": "ratingTrends", "key": (("bookId", 1), ("bucket", 1), ("period", -1))},
+}
+
+
+def split_name(base: str, entity: str) -> str:
+    return f"{base}_{ENTITIES[entity]['suffix']}"
+
+
+def succeeded(ops: list, error: BulkWriteError, ordered: bool) -> list:
+    """The ops of a failed bulk write that were applied anyway."""
+    failed = sorted(w["index"] for w in error.details.get("writeErrors", []))
+    if ordered:
+        # an ordered write stops at its first error
+        return ops[:failed[0]] if failed else list(ops)
+    failed = set(failed)
+    return [op for i, op in enumerate(ops) if i not in failed]
+
+
+class DualCollection:
+    """Collection proxy for the cutover: reads from `primary`, writes to `primary`
+    and then the same write to `secondary`.
+
+    Mirroring is best effort. A failed mirror is logged and counted, and left for
+    `python -m app.migrate verify --repair` to fix.
+    """
+
+    def __init__(self, primary, secondary, storage):
+        self.primary = primary
+        self.secondary = secondary
+        self.storage = storage
+
+    def __getattr__(self, name):
+        # reads (find, aggregate, count_documents, ...) and everything else
+        return getattr(self.primary, name)
+
+    @property
+    def name(self):
+        return self.primary.name
+
+    # Writes are mirrored only once the primary write succeeded, with the caller's
+    # filter rather than the _id: aggregates can have another _id in the split
+    # collection (see migrate.py).
+
+    async def _mirror(self, write):
+        try:
+            await write
+        except Exception:
+            self.storage.mirror_errors += 1
+            log.exception("mirroring a write to %s failed", self.secondary.name)
+
+    async def insert_one(self, doc, **kwargs):
+        result = await self.primary.insert_one(doc, **kwargs)
+        # the driver has set doc["_id"]; upserting keeps the mirror idempotent
+        await self._mirror(self.secondary.replace_one({"_id": doc["_id"]}, doc, upsert=True))
+        return result
+
+    async def insert_many(self, docs, **kwargs):
+        docs = list(docs)
+        try:
+            result = await self.primary.insert_many(docs, **kwargs)
+        except BulkWriteError as e:
+            await self._mirror_inserts(succeeded(docs, e, kwargs.get("ordered", True)))
+            raise
+        await self._mirror_inserts(docs)
+        return result
+
+    async def _mirror_inserts(self, docs):
+        ops = [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs if "_id" in d]
+        if ops:
+            await self._mirror(self.secondary.bulk_write(ops, ordered=False))
+
+    async def update_one(self, filter, update, **kwargs):
+        result = await self.primary.update_one(filter, update, **kwargs)
+        await self._mirror(self.secondary.update_one(filter, update, **kwargs))
+        return result
+
+    async def update_many(self, filter, update, **kwargs):
+        result = await self.primary.update_many(filter, update, **kwargs)
+        await self._mirror(self.secondary.update_many(filter, update, **kwargs))
+        return result
+
+    async def replace_one(self, filter, replacement, **kwargs):
+        result = await self.primary.replace_one(filter, replacement, **kwargs)
+        await self._mirror(self.secondary.replace_one(filter, replacement, **kwargs))
+        return result
+
+    async def delete_one(self, filter, **kwargs):
+        result = await self.primary.delete_one(filter, **kwargs)
+        await self._mirror(self.secondary.delete_one(filter, **kwargs))
+        return result
+
+    async def delete_many(self, filter, **kwargs):
+        result = await self.primary.delete_many(filter, **kwargs)
+        await self._mirror(self.secondary.delete_many(filter, **kwargs))
+        return result
+
+    async def bulk_write(self, ops, **kwargs):
+        ops = list(ops)
+        try:
+            result = await self.primary.bulk_write(ops, **kwargs)
+        except BulkWriteError as e:
+            done = succeeded(ops, e, kwargs.get("ordered", True))
+            if done:
+                await self._mirror(self.secondary.bulk_write(done, ordered=False))
+            raise
+        await self._mirror(self.secondary.bulk_write(ops, ordered=False))
+        return result
+
+    async def find_one_and_update(self, filter, update, **kwargs):
+        doc = await self.primary.find_one_and_update(filter, update, **kwargs)
+        await self._mirror(self.secondary.update_one(filter, update, upsert=kwargs.get("upsert", False)))
+        return doc
+
+    async def find_one_and_replace(self, filter, replacement, **kwargs):
+        doc = await self.primary.find_one_and_replace(filter, replacement, **kwargs)
+        await self._mirror(self.secondary.replace_one(filter, replacement, upsert=kwargs.get("upsert", False)))
+        return doc
+
+    async def find_one_and_delete(self, filter, **kwargs):
+        doc = await self.primary.find_one_and_delete(filter, **kwargs)
+        await self._mirror(self.secondary.delete_one(filter))
+        return doc
+
+
+class Storage:
+    """Hands out the collection of an entity in the configured layout."""
+
+    def __init__(self, db, base: str, layout: str = STORAGE_LAYOUT):
+        if layout not in LAYOUTS:
+            raise ValueError(f"STORAGE_LAYOUT must be one of {', '.join(LAYOUTS)}, not {layout!r}")
+        self.db = db
+        self.base = base
+        self.layout = layout
+        self.mirror_errors = 0
+        self._colls = {}
+
+    def coll(self, entity: str):
+        if entity not in ENTITIES:
+            raise KeyError(entity)
+        coll = self._colls.get(entity)
+        if coll is None:
+            if self.layout == "shared":
+                coll = self.db[self.base]
+            elif self.layout == "split":
+                coll = self.db[split_name(self.base, entity)]
+            else:
+                coll = DualCollection(self.db[self.base], self.db[split_name(self.base, entity)], self)
+            self._colls[entity] = coll
+        return coll
+
+    def same_collection(self, *entities) -> bool:
+        """Whether reads of all these entities go to one collection, so one query can cover them."""
+        return self.layout != "split" or len(set(entities)) <= 1
+
+    def union_with(self, entity: str, pipeline: list) -> dict:
+        """$unionWith stage appending `pipeline` run on the collection of `entity`.
+
+        Each branch is planned on its own, so its $match/$sort can use indexes,
+        unlike the sub-pipelines of a $facet.
+        """
+        return {"$unionWith": {"coll": self.coll(entity).name, "pipeline": pipeline}}
+
+    def collection_names(self) -> dict:
+        """Every collection the layout writes, with the entities stored in it."""
+        names = {}
+        if self.layout in ("shared", "dual"):
+            names[self.base] = list(ENTITIES)
+        if self.layout in ("split", "dual"):
+            for entity in ENTITIES:
+                names[split_name(self.base, entity)] = [entity]
+        return names
+
+    async def bulk_write(self, ops_by_entity: dict, ordered: bool = False):
+        """Writes ops for several entities with one bulk_write per collection."""
+        groups = {}
+        for entity, ops in ops_by_entity.items():
+            if ops:
+                coll = self.coll(entity)
+                groups.setdefault(coll.name, (coll, []))[1].extend(ops)
+        if self.layout != "dual":
+            await asyncio.gather(*(coll.bulk_write(ops, ordered=ordered) for coll, ops in groups.values()))
+            return
+        # one write to the shared collection, then each entity's mirror of the
+        # ops that were applied
+        tagged = [(entity, op) for entity, ops in ops_by_entity.items() for op in ops or ()]
+        done, error = tagged, None
+        try:
+            await self.db[self.base].bulk_write([op for _, op in tagged], ordered=ordered)
+        except BulkWriteError as e:
+            done, error = succeeded(tagged, e, ordered), e
+        for entity in ops_by_entity:
+            ops = [op for e, op in done if e == entity]
+            if ops:
+                dual = self.coll(entity)
+                await dual._mirror(dual.secondary.bulk_write(ops, ordered=False))
+        if error is not None:
+            raise error
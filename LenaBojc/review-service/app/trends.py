@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import UpdateOne
+from .ratings import STARS, flush_guarded, guarded_write, rating_inc, versions
+
+# Rating trend rollups: one "ratingTrend" document per book, bucket and period,
+# {bookId, bucket: "month" | "week", period: "2025-07" | "2025-W29", sum, count,
+# hist}. A review counts in the period it was created in, also after it is
+# re-rated. Writes $inc the month and week documents in the same bulk_write as
+# the book's rating aggregate; `python -m app.trends backfill` recomputes them.
+
+TREND_TYPE = "ratingTrend"
+BUCKETS = ("month", "week")
+
+# $dateToString formats producing the same period strings as period_of()
+_FORMATS = {"month": "%Y-%m", "week": "%G-W%V"}
+
+
+def period_of(created_at: datetime, bucket: str) -> str:
+    if bucket == "week":
+        year, week, _ = created_at.isocalendar()
+        return f"{year:04d}-W{week:02d}"
+    return f"{created_at.year:04d}-{created_at.month:02d}"
+
+
+def _update(book_id: str, bucket: str, period: str, inc: dict, now: datetime) -> UpdateOne:
+    return UpdateOne(
+        {"type": TREND_TYPE, "bookId": book_id, "bucket": bucket, "period": period},
+        {"$inc": inc, "$set": {"updatedAt": now}},
+        upsert=True,
+    )
+
+
+def trend_updates(book_id: str, created_at: Optional[datetime], add: Optional[int] = None, remove: Optional[int] = None, now: Optional[datetime] = None) -> list:
+    """Rollup writes for one changed review created at `created_at`."""
+    inc = rating_inc(add, remove)
+    if not inc or created_at is None:
+        return []
+    now = now or datetime.now(timezone.utc)
+    return [_update(book_id, b, period_of(created_at, b), inc, now) for b in BUCKETS]
+
+
+def trend_batch_ops(rows, now: Optional[datetime] = None) -> list:
+    """Rollup writes for many new ratings; `rows` holds `(bookId, rating, createdAt)`."""
+    now = now or datetime.now(timezone.utc)
+    incs = {}
+    for book_id, rating, created_at in rows:
+        for bucket in BUCKETS:
+            inc = incs.setdefault((book_id, bucket, period_of(created_at, bucket)), {})
+            for k, v in rating_inc(add=rating).items():
+                inc[k] = inc.get(k, 0) + v
+    return [_update(book_id, bucket, period, inc, now) for (book_id, bucket, period), inc in incs.items() if inc]
+
+
+def trend_point(doc: dict) -> dict:
+    hist = doc.get("hist", {})
+    return {
+        "period": doc["period"],
+        "count": doc["count"],
+        "mean": round(doc["sum"] / doc["count"], 2),
+        "histogram": {str(s): max(hist.get(str(s), 0), 0) for s in STARS},
+    }
+
+
+async def rebuild_trends(reviews, trends) -> dict:
+    """Recomputes every ratingTrend document from the reviews themselves.
+
+    Safe to run next to live writes, see guarded_write(). Periods that no longer
+    have any reviews are zeroed, not deleted.
+    """
+    stamp = datetime.now(timezone.utc)
+    key_fields = ("bookId", "bucket", "period")
+    prev = await versions(trends, {"type": TREND_TYPE}, key_fields)
+    periods = skipped = 0
+    for bucket in BUCKETS:
+        pipeline = [
+            {"$match": {"type": "review", "rating": {"$gte": 1, "$lte": 5}, "createdAt": {"$type": "date"}}},
+            {"$group": {
+                "_id": {"bookId": "$bookId", "period": {"$dateToString": {"format": _FORMATS[bucket], "date": "$createdAt"}}},
+                "sum": {"$sum": "$rating"},
+                "count": {"$sum": 1},
+                **{f"h{s}": {"$sum": {"$cond": [{"$eq": ["$rating", s]}, 1, 0]}} for s in STARS},
+            }},
+        ]
+        ops = []
+        async for row in reviews.aggregate(pipeline, allowDiskUse=True):
+            key = (row["_id"]["bookId"], bucket, row["_id"]["period"])
+            ops.append(guarded_write(
+                {"type": TREND_TYPE, **dict(zip(key_fields, key))},
+                prev.pop(key, None),
+                {"sum": row["sum"], "count": row["count"], "hist": {str(s): row[f"h{s}"] for s in STARS}, "updatedAt": stamp},
+            ))
+            if len(ops) >= 1000:
+                missed = await flush_guarded(trends, ops)
+                periods += len(ops) - missed
+                skipped += missed
+                ops = []
+        missed = await flush_guarded(trends, ops)
+        periods += len(ops) - missed
+        skipped += missed
+
+    # what is left has no reviews any more
+    zero = {"sum": 0, "count": 0, "hist": {str(s): 0 for s in STARS}, "updatedAt": stamp}
+    ops = [guarded_write({"type": TREND_TYPE, **dict(zip(key_fields, key))}, doc, zero) for key, doc in prev.items()]
+    zero_skipped = 0
+    for i in range(0, len(ops), 1000):
+        zero_skipped += await flush_guarded(trends, ops[i:i + 1000])
+    return {"periods": periods, "zeroed": len(ops) - zero_skipped, "skipped": skipped + zero_skipped}
+
+
+async def _main(argv):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from .storage import Storage
+
+    if argv[1:] != ["backfill"]:
+        print("usage: python -m app.trends backfill", file=sys.stderr)
+        return 2
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL"))
+    try:
+        storage = Storage(client[os.getenv("DB_NAME")], os.getenv("COLLECTION_NAME"))
+        result = await rebuild_trends(storage.coll("review"), storage.coll(TREND_TYPE))
+    finally:
+        client.close()
+    print(f"rebuilt {result['periods']} rating trend periods, zeroed {result['zeroed']}, skipped {result['skipped']} changed while rebuilding")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv)))
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("COLLECTION_NAME", "reviews")
+os.environ["RATING_REBUILD_INTERVAL"] = "0"
+
+import uvicorn  # noqa: E402
+
+from app import main  # noqa: E402
+from app.storage import Storage  # noqa: E402
+
+
+class Books:
+    """book-service stand-in: every book exists."""
+
+    async def exists(self, book_id):
+        return True
+
+    async def genres(self, book_id):
+        return []
+
+    def cached_genres(self, book_id):
+        return []
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    srv = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=srv.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not srv.started:
+        assert time.monotonic() < deadline, "uvicorn did not start"
+        time.sleep(0.01)
+    main.app.db = mongomock_motor.AsyncMongoMockClient()["test"]
+    main.app.storage = Storage(main.app.db, main.COLL, "shared")
+    main.app.books = Books()
+    # mongomock ignores partial filters, so the service's indexes cannot be built
+    # here; these tests never import duplicates
+    main.app.unique_indexes_ready = True
+    yield f"http://127.0.0.1:{port}"
+    srv.should_exit = True
+    thread.join(timeout=10)
+
+
+def _lines(n, book):
+    return [json.dumps({"userId": f"u{i}", "bookId": book, "rating": 1 + i % 5}).encode() + b"\n" for i in range(n)]
+
+
+def _count(book):
+    coll = main.app.storage.coll("review")
+    return asyncio.run(coll.count_documents({"type": "review", "bookId": book}))
+
+
+def _summary(resp):
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    return rows[-1]["summary"], rows[:-1]
+
+
+def test_import_body_in_one_piece(server):
+    resp = httpx.post(f"{server}/reviews/bulk", content=b"".join(_lines(200, "one")),
+                      headers={"Content-Type": "application/x-ndjson"}, timeout=30)
+    assert resp.status_code == 200
+    summary, rows = _summary(resp)
+    assert summary == {"created": 200, "failed": 0}
+    assert len(rows) == 200
+    assert _count("one") == 200
+
+
+def test_import_chunked_body(server):
+    def body():
+        yield from _lines(50, "chunked")
+
+    resp = httpx.post(f"{server}/reviews/bulk", content=body(),
+                      headers={"Content-Type": "application/x-ndjson"}, timeout=30)
+    assert resp.status_code == 200
+    summary, _ = _summary(resp)
+    assert summary == {"created": 50, "failed": 0}
+    assert _count("chunked") == 50
+
+
+def test_import_keeps_created_at(server):
+    lines = [
+        {"userId": "u1", "bookId": "dated", "rating": 4, "createdAt": "2021-03-04T05:06:07Z"},
+        {"userId": "u2", "bookId": "dated", "rating": 5},
+        {"userId": "u3", "bookId": "dated", "rating": 5, "createdAt": "yesterday"},
+    ]
+    resp = httpx.post(f"{server}/reviews/bulk", content=b"".join(json.dumps(l).encode() + b"\n" for l in lines),
+                      headers={"Content-Type": "application/x-ndjson"}, timeout=30)
+    summary, rows = _summary(resp)
+    assert summary == {"created": 2, "failed": 1}
+    assert rows[2]["status"] == 400 and rows[2]["errors"][0]["loc"] == ["createdAt"]
+    coll = main.app.storage.coll("review")
+    doc = asyncio.run(coll.find_one({"type": "review", "bookId": "dated", "userId": "u1"}))
+    assert doc["createdAt"].year == 2021
+    trends = main.app.storage.coll("ratingTrend")
+    periods = asyncio.run(trends.distinct("period", {"type": "ratingTrend", "bookId": "dated", "bucket": "month"}))
+    assert "2021-03" in periods and len(periods) == 2
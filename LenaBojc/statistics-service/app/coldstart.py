@@ -0,0 +1,114 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+
+# Cold-start budget check. Each run starts a fresh uvicorn worker and measures
+#
+#   import     importing app.main in a fresh interpreter
+#   ready      process start until the first response on --ready-path
+#   openapi    the first /openapi.json request on that worker
+#
+# and fails (exit 1) when the median of `ready + openapi`, the time until a new
+# worker has answered a real request, is over --budget-ms. Run it from the
+# service directory, in the image or in CI:
+#
+#   python -m app.coldstart --budget-ms 2000
+#
+# Mongo does not have to be reachable: the driver connects lazily and startup
+# does not wait for it. Without a .env file, placeholder DB_NAME and
+# COLLECTION_NAME values are used for whatever the environment does not set.
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_MS = float(os.getenv("COLDSTART_BUDGET_MS", "2500"))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    if not (SERVICE_DIR / ".env").exists():
+        env.setdefault("DB_NAME", "coldstart")
+        env.setdefault("COLLECTION_NAME", "coldstart")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SERVICE_DIR, env=_env(), capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1]) * 1000
+
+
+def measure_start(ready_path: str, openapi_path: str = "/openapi.json", timeout: float = 30.0) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    errors = tempfile.TemporaryFile()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=errors,
+    )
+    try:
+        with httpx.Client(base_url=base, timeout=5.0) as client:
+            while True:
+                if proc.poll() is not None:
+                    errors.seek(0)
+                    tail = errors.read().decode(errors="replace").strip().splitlines()[-5:]
+                    raise RuntimeError(f"uvicorn exited with {proc.returncode} before answering:\n" + "\n".join(tail))
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"no response on {ready_path} within {timeout:.0f}s")
+                try:
+                    client.get(ready_path)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            ready = (time.perf_counter() - started) * 1000
+            t = time.perf_counter()
+            client.get(openapi_path).raise_for_status()
+            openapi = (time.perf_counter() - t) * 1000
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        errors.close()
+    return {"ready": ready, "openapi": openapi}
+
+
+def _main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.coldstart", description="Measure worker cold start against a budget.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ready-path", default="/metrics")
+    args = parser.parse_args(argv[1:])
+
+    runs = []
+    for _ in range(args.runs):
+        run = measure_start(args.ready_path)
+        run["import"] = measure_import()
+        run["total"] = run["ready"] + run["openapi"]
+        runs.append(run)
+    for key in ("import", "ready", "openapi", "total"):
+        values = [r[key] for r in runs]
+        print(f"{key:8} median {statistics.median(values):8.1f} ms   max {max(values):8.1f} ms")
+    median = statistics.median(r["total"] for r in runs)
+    if median > args.budget_ms:
+        print(f"over budget: {median:.1f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    print(f"within budget: {median:.1f} ms <= {args.budget_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv))
@@ -0,0 +1,131 @@
+import logging
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+log = logging.getLogger("statistics-service.indexes")
+
+# ----- Manifest -----
+# Every index the service relies on lives here, with the entities it serves. The
+# reconciler compares this list with what is actually built at startup. In the
+# split storage layout each index is built on the collection of every entity it
+# serves, without the partial filter (see layout_manifest()).
+
+INDEXES = [
+    {
+        "name": "userGoal_type_userId_year_unique",
+        "entities": ("userGoal",),
+        "keys": [("type", ASCENDING), ("userId", ASCENDING), ("year", DESCENDING)],
+        "unique": True,
+        "partialFilterExpression": {"type": "userGoal"},
+    },
+    {
+        "name": "readBooks_type_userId_bookId_unique",
+        "entities": ("readBooks",),
+        "keys": [("type", ASCENDING), ("userId", ASCENDING), ("book.bookId", ASCENDING)],
+        "unique": True,
+        "partialFilterExpression": {"type": "readBooks"},
+    },
+]
+
+_OPTIONS = ("unique", "partialFilterExpression")
+
+
+def layout_manifest(collections: dict, manifest=INDEXES) -> dict:
+    """Index specs per collection; `collections` maps collection names to the entities stored there."""
+    out = {}
+    for name, entities in collections.items():
+        if len(entities) > 1:
+            out[name] = [spec for spec in manifest if set(spec["entities"]) & set(entities)]
+        else:
+            out[name] = [
+                {k: v for k, v in spec.items() if k not in ("entities", "partialFilterExpression")}
+                for spec in manifest if entities[0] in spec["entities"]
+            ]
+    return out
+
+
+def _spec(name, info) -> dict:
+    spec = {"name": name, "keys": [(k, int(v) if isinstance(v, (int, float)) else v) for k, v in info["key"]]}
+    for opt in _OPTIONS:
+        if info.get(opt):
+            spec[opt] = info[opt]
+    return spec
+
+
+def _same(wanted: dict, built: dict) -> bool:
+    if [tuple(k) for k in wanted["keys"]] != [tuple(k) for k in built["keys"]]:
+        return False
+    return all(wanted.get(opt) == built.get(opt) for opt in _OPTIONS)
+
+
+def diff_indexes(built: dict, manifest=INDEXES) -> dict:
+    """Compares `index_information()` output with the manifest."""
+    built_specs = {name: _spec(name, info) for name, info in built.items() if name != "_id_"}
+    missing, mismatched = [], []
+    for wanted in manifest:
+        have = built_specs.get(wanted["name"])
+        if have is None:
+            missing.append(wanted["name"])
+        elif not _same(wanted, have):
+            mismatched.append({"name": wanted["name"], "wanted": wanted, "built": have})
+    wanted_names = {w["name"] for w in manifest}
+    extra = sorted(name for name in built_specs if name not in wanted_names)
+    return {"missing": missing, "mismatched": mismatched, "extra": extra}
+
+
+def _model(spec: dict) -> IndexModel:
+    return IndexModel(spec["keys"], name=spec["name"], **{opt: spec[opt] for opt in _OPTIONS if opt in spec})
+
+
+async def reconcile_indexes(coll, manifest=INDEXES) -> dict:
+    """Builds every missing manifest index and returns what still differs.
+
+    Mismatched and extra indexes are only reported, never dropped; changing an
+    existing index is an operator decision.
+    """
+    before = diff_indexes(await coll.index_information(), manifest)
+    errors = {}
+    for spec in manifest:
+        if spec["name"] not in before["missing"]:
+            continue
+        try:
+            await coll.create_indexes([_model(spec)])
+            log.info("created index %s on %s", spec["name"], coll.name)
+        except Exception as e:
+            log.warning("could not create index %s on %s: %s", spec["name"], coll.name, e)
+            errors[spec["name"]] = str(e)
+
+    report = diff_indexes(await coll.index_information(), manifest)
+    report["created"] = [n for n in before["missing"] if n not in report["missing"]]
+    report["errors"] = errors
+    return report
+
+
+def unique_indexes_ready(report: dict, manifest=INDEXES) -> bool:
+    """True when a reconcile report shows every unique manifest index built as specified.
+
+    Until then the routes that rely on those indexes for their 409s also check for
+    duplicates with a read first.
+    """
+    unique = {spec["name"] for spec in manifest if spec.get("unique")}
+    pending = report["missing"] + [m["name"] for m in report["mismatched"]]
+    return not any(name.rsplit(".", 1)[-1] in unique for name in pending)
+
+
+async def reconcile_layout(db, collections: dict, manifest=INDEXES) -> dict:
+    """reconcile_indexes() on every collection of the storage layout.
+
+    With more than one collection, index names in the report are prefixed with
+    the collection name.
+    """
+    manifests = layout_manifest(collections, manifest)
+    if len(manifests) == 1:
+        name, specs = next(iter(manifests.items()))
+        return await reconcile_indexes(db[name], specs)
+    report = {"missing": [], "mismatched": [], "extra": [], "created": [], "errors": {}}
+    for name, specs in manifests.items():
+        part = await reconcile_indexes(db[name], specs)
+        for key in ("missing", "extra", "created"):
+            report[key].extend(f"{name}.{n}" for n in part[key])
+        report["mismatched"].extend({**m, "name": f"{name}.{m['name']}"} for m in part["mismatched"])
+        report["errors"].update({f"{name}.{n}": e for n, e in part["errors"].items()})
+    return report
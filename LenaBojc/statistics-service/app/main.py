@@ -1,18 +1,28 @@
 import os
+import asyncio
+import time
 import httpx
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 from bson import ObjectId
 from collections import Counter
 from pymongo import ReturnDocument
-from fastapi import FastAPI, Request, status
+from pymongo.errors import DuplicateKeyError
+from fastapi import FastAPI, Query, Request, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 # from pymongo.mongo_client import MongoClient
 # from pymongo.server_api import ServerApi
-from .models import GoalIn, GoalOut, GoalCreated, BookRef, GoalRemoveBookIn, GoalTargetIn, GoalAddBookIn, ReadBookCreated, ReadBookIn, ReadBookOut, GoalCreatedWithCoach
+from .indexes import reconcile_layout, unique_indexes_ready
+from .instrumentation import CommandCounter, RoundTripStats, mongo_commands
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics
+from .openapi import install as install_openapi
+from .slowqueries import SlowQueryLog
+from .storage import STORAGE_LAYOUT, Storage
+from .serialization import respond
+from .models import IndexReport, IndexReportOut, RoundTripStatsOut, SlowQueries, GoalIn, GoalCreated, GoalRemoveBookIn, GoalTargetIn, GoalAddBookIn, ReadBookCreated, ReadBookIn, GoalCreatedWithCoach
 
 load_dotenv()
 MONGO_URL = os.getenv("MONGO_URL")
@@ -20,7 +30,9 @@ DB_NAME = os.getenv("DB_NAME")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 SHELVES_API_URL = os.getenv("SHELVES_API_URL")
 
-app = FastAPI(title="Statistics Service", version="1.0")
+app = FastAPI(title="Statistics Service", version="1.0", openapi_url=None)
+# /openapi.json, /docs and /redoc serve the build-time schema snapshot, see openapi.py
+install_openapi(app)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -28,17 +40,65 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.round_trips = RoundTripStats()
+app.metrics = Metrics()
+app.slow_queries = SlowQueryLog()
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    app.metrics.requests.observe(
+        time.perf_counter() - started,
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code),
+    )
+    return response
+
+@app.middleware("http")
+async def count_mongo_round_trips(request: Request, call_next):
+    commands = []
+    token = mongo_commands.set(commands)
+    try:
+        response = await call_next(request)
+    finally:
+        mongo_commands.reset(token)
+    route = request.scope.get("route")
+    if route is not None:
+        app.round_trips.record(route.name, len(commands))
+    response.headers["X-Mongo-Round-Trips"] = str(len(commands))
+    return response
+
 # ----- Startup/Shutdown -----
 
 @app.on_event("startup")
 async def startup_db_client():
-    app.mongodb_client = AsyncIOMotorClient(MONGO_URL)
+    app.mongodb_client = AsyncIOMotorClient(MONGO_URL, event_listeners=[CommandCounter(), app.metrics.mongo, app.slow_queries])
+    app.slow_queries.attach(asyncio.get_running_loop(), app.mongodb_client)
     app.mongodb = app.mongodb_client[DB_NAME]
+    app.storage = Storage(app.mongodb, COLLECTION_NAME, STORAGE_LAYOUT)
+    app.index_report = {"status": "pending"}
+    app.unique_indexes_ready = False
+    # reconciled in the background so index builds never hold up readiness
+    app.index_task = asyncio.create_task(_reconcile_indexes())
+    app.loop_lag_task = asyncio.create_task(app.metrics.watch_loop_lag())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.index_task.cancel()
+    app.loop_lag_task.cancel()
     app.mongodb_client.close()
 
+async def _reconcile_indexes():
+    try:
+        report = await reconcile_layout(app.mongodb, app.storage.collection_names())
+        app.index_report = {"status": "done", **report}
+        app.unique_indexes_ready = unique_indexes_ready(report)
+    except Exception as e:
+        app.index_report = {"status": "failed", "error": str(e)}
+
 # ----- POST -----
 
 @app.post(
@@ -121,36 +181,43 @@ async def create_user_goal(body: GoalIn):
         "targetBooks": body.targetBooks,    
         "books": [],                    
         "completedBooks": 0,                
-        "createdAt": datetime.now(timezone.utc)  
+        "createdAt": _utcnow()
     }
 
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
-    try:
-        existing = await coll.find_one({"type": "userGoal", "userId": body.userId, "year": year})
+    # one goal per (userId, year) is enforced by a unique index; until the
+    # reconciler has confirmed it is built, duplicates are also looked for first
+    if not app.unique_indexes_ready:
+        try:
+            existing = await coll.find_one({"type": "userGoal", "userId": body.userId, "year": year}, {"_id": 1})
+        except Exception:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"message": "Internal server error while creating goal"},
+            )
         if existing:
             return JSONResponse(
                 status_code=status.HTTP_409_CONFLICT,
                 content={"message": "Goal for this user and year already exists"},
             )
-    except Exception:
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": "Internal server error while creating goal"},
-        )
 
     try:
-        ins = await coll.insert_one(doc)                        
-        created = await coll.find_one({"_id": ins.inserted_id}) 
-        out = _to_out(created)
+        await coll.insert_one(doc)
+        out = _to_out(doc)
         
         # SHELVES_API_URL: check if any books on READ shelf and add them to books
         # SHELVES_API_URL/shelves/{userId}/read, vrne List[BookRef]
 
-        return {
-            "message": "Goal created successfully",            
-            "data": out,                                        
-        }
+        return respond({
+            "message": "Goal created successfully",
+            "data": out,
+        }, status.HTTP_201_CREATED)
+    except DuplicateKeyError:
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"message": "Goal for this user and year already exists"},
+        )
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -234,7 +301,7 @@ async def create_user_goal(body: GoalIn):
     name="logReadBook",
 )
 async def log_read_book(body: ReadBookIn):
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
     src_oid = None
     if body.fromGoalId:
@@ -249,7 +316,7 @@ async def log_read_book(body: ReadBookIn):
                 },
             )
         try:
-            src = await coll.find_one({"_id": src_oid, "type": "userGoal"})
+            src = await coll.find_one({"_id": src_oid, "type": "userGoal"}, {"userId": 1})
             if not src:
                 return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Source goal not found"})
             if src.get("userId") != body.userId:
@@ -263,22 +330,7 @@ async def log_read_book(body: ReadBookIn):
                 content={"message": "Internal server error while creating readBooks record"},
             )
 
-    try:
-        dup = await coll.find_one(
-            {"type": "readBooks", "userId": body.userId, "book.bookId": body.book.bookId}
-        )
-        if dup:
-            return JSONResponse(
-                status_code=status.HTTP_409_CONFLICT,
-                content={"message": "Read book already logged for this user"},
-            )
-    except Exception:
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": "Internal server error while creating readBooks record"},
-        )
-
-    now = datetime.now(timezone.utc)
+    now = _utcnow()
     doc = {
         "type": "readBooks",
         "userId": body.userId,
@@ -290,13 +342,35 @@ async def log_read_book(body: ReadBookIn):
     if doc["book"].get("finishedAt") is None:
         doc["book"]["finishedAt"] = now
 
+    # one record per (userId, bookId) is enforced by a unique index; until the
+    # reconciler has confirmed it is built, duplicates are also looked for first
+    if not app.unique_indexes_ready:
+        try:
+            dup = await app.storage.coll("readBooks").find_one(
+                {"type": "readBooks", "userId": body.userId, "book.bookId": body.book.bookId}, {"_id": 1}
+            )
+        except Exception:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"message": "Internal server error while creating readBooks record"},
+            )
+        if dup:
+            return JSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={"message": "Read book already logged for this user"},
+            )
+
     try:
-        ins = await coll.insert_one(doc)
-        created = await coll.find_one({"_id": ins.inserted_id})
-        return {
+        await app.storage.coll("readBooks").insert_one(doc)
+        return respond({
             "message": "Read book logged successfully",
-            "data": _rb_to_out(created),
-        }
+            "data": _rb_to_out(doc),
+        }, status.HTTP_201_CREATED)
+    except DuplicateKeyError:
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"message": "Read book already logged for this user"},
+        )
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -379,7 +453,7 @@ async def change_user_goal(id: str, body: GoalTargetIn):
             },
         )
 
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
     try:
         updated = await coll.find_one_and_update(
@@ -399,10 +473,10 @@ async def change_user_goal(id: str, body: GoalTargetIn):
             content={"message": "Goal not found"},
         )
 
-    return {
+    return respond({
         "message": "Goal targetBooks updated successfully",
         "data": _to_out(updated),
-    }
+    })
 
 @app.put(
     "/goals/{id}/books",
@@ -504,44 +578,20 @@ async def add_book_to_goal(id: str, body: GoalAddBookIn):
             },
         )
 
-    coll = app.mongodb[COLLECTION_NAME]
-
-    try:
-        goal = await coll.find_one({"_id": oid, "type": "userGoal"})
-        if not goal:
-            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Goal not found"})
-        if goal.get("userId") != body.userId:
-            return JSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={"message": "Forbidden: goal belongs to a different user"},
-            )
-    except Exception:
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": "Internal server error while updating goal"},
-        )
-
-    try:
-        exists = await coll.find_one(
-            {"_id": oid, "type": "userGoal", "books.bookId": body.book.bookId}
-        )
-        if exists:
-            return JSONResponse(
-                status_code=status.HTTP_409_CONFLICT,
-                content={"message": "Book already added to this goal"},
-            )
-    except Exception:
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": "Internal server error while updating goal"},
-        )
+    coll = app.storage.coll("userGoal")
 
+    # ownership and the duplicate check are part of the filter; only a miss needs a second look
     try:
         updated = await coll.find_one_and_update(
-            {"_id": oid, "type": "userGoal"},
+            {"_id": oid, "type": "userGoal", "userId": body.userId, "books.bookId": {"$ne": body.book.bookId}},
             {"$push": {"books": body.book.model_dump()}, "$inc": {"completedBooks": 1}},
             return_document=ReturnDocument.AFTER,
         )
+        if not updated:
+            goal = await coll.find_one(
+                {"_id": oid, "type": "userGoal"},
+                {"userId": 1, "books": {"$elemMatch": {"bookId": body.book.bookId}}},
+            )
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -549,12 +599,22 @@ async def add_book_to_goal(id: str, body: GoalAddBookIn):
         )
 
     if not updated:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Goal not found"})
+        if not goal:
+            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Goal not found"})
+        if goal.get("userId") != body.userId:
+            return JSONResponse(
+                status_code=status.HTTP_403_FORBIDDEN,
+                content={"message": "Forbidden: goal belongs to a different user"},
+            )
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"message": "Book already added to this goal"},
+        )
 
-    return {
+    return respond({
         "message": "Book added to goal successfully",
         "data": _to_out(updated),
-    }
+    })
 
 # ----- GET -----
 @app.get(
@@ -604,7 +664,7 @@ async def add_book_to_goal(id: str, body: GoalAddBookIn):
     name="goalByUserId",
 )
 async def get_goal_by_userid(userId: str):
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
     try:
         goal = await coll.find_one({"type": "userGoal", "userId": userId})
@@ -613,10 +673,11 @@ async def get_goal_by_userid(userId: str):
                 status_code=status.HTTP_404_NOT_FOUND,
                 content={"message": "Goal not found for this user"},
             )
-        return {
+        return respond({
             "message": "Goal found successfully",
             "data": _to_out(goal),
-        }
+            "coach": None,
+        })
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -683,7 +744,7 @@ async def read_pages_in_goal(id: str):
             },
         )
 
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
     try:
         goal = await coll.find_one({"_id": oid, "type": "userGoal"})
@@ -757,7 +818,7 @@ async def read_pages_in_goal(id: str):
 )
 async def book_genres_comparison(userId: str):
     year = datetime.now(timezone.utc).year
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
     try:
         goal = await coll.find_one({"type": "userGoal", "userId": userId, "year": year})
@@ -864,18 +925,11 @@ async def remove_book_from_goal(id: str, body: GoalRemoveBookIn):
             },
         )
 
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
     try:
-        goal = await coll.find_one({"_id": oid, "type": "userGoal", "books.bookId": body.bookId})
-        if not goal:
-            return JSONResponse(
-                status_code=status.HTTP_404_NOT_FOUND,
-                content={"message": "Goal or book not found"},
-            )
-
         updated = await coll.find_one_and_update(
-            {"_id": oid, "type": "userGoal"},
+            {"_id": oid, "type": "userGoal", "books.bookId": body.bookId},
             {"$pull": {"books": {"bookId": body.bookId}}, "$inc": {"completedBooks": -1}},
             return_document=ReturnDocument.AFTER,
         )
@@ -886,10 +940,10 @@ async def remove_book_from_goal(id: str, body: GoalRemoveBookIn):
                 content={"message": "Goal or book not found"},
             )
 
-        return {
+        return respond({
             "message": "Book removed from goal successfully",
             "data": _to_out(updated),
-        }
+        })
     except Exception:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -955,7 +1009,7 @@ async def remove_goal(id: str):
             },
         )
 
-    coll = app.mongodb[COLLECTION_NAME]
+    coll = app.storage.coll("userGoal")
 
     try:
         result = await coll.delete_one({"_id": oid, "type": "userGoal"})
@@ -973,6 +1027,151 @@ async def remove_goal(id: str):
         )
 
 
+# ----- ADMIN -----
+
+@app.get(
+    "/admin/indexes",
+    description=(
+        "Reports how the indexes built on the statistics collection differ from the index manifest. "
+        "Missing indexes are created in the background at startup; mismatched and extra ones are only reported."
+    ),
+    summary="Index reconciliation report",
+    tags=["Admin"],
+    response_model=IndexReportOut,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Index report fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Index report fetched successfully",
+                        "data": {
+                            "status": "done",
+                            "missing": [],
+                            "mismatched": [],
+                            "extra": [],
+                            "created": ["userGoal_type_userId_year_unique"],
+                            "errors": {}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="indexReport",
+)
+async def index_report():
+    return {
+        "message": "Index report fetched successfully",
+        "data": IndexReport(**app.index_report).model_dump(),
+    }
+
+@app.get(
+    "/admin/round-trips",
+    description=(
+        "Mongo round trips used per endpoint since startup: request count, total and maximum round trips, and the average. "
+        "Every response also carries the count for that request in the X-Mongo-Round-Trips header."
+    ),
+    summary="Mongo round trips per endpoint",
+    tags=["Admin"],
+    response_model=RoundTripStatsOut,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Round trip stats fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Round trip stats fetched successfully",
+                        "data": {
+                            "addBookToGoal": {"requests": 40, "roundTrips": 41, "max": 2, "avg": 1.02},
+                            "createUserGoal": {"requests": 5, "roundTrips": 5, "max": 1, "avg": 1.0}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="roundTripStats",
+)
+async def round_trip_stats():
+    return {
+        "message": "Round trip stats fetched successfully",
+        "data": app.round_trips.snapshot(),
+    }
+
+@app.get(
+    "/debug/slow-queries",
+    description=(
+        "Mongo commands slower than SLOW_QUERY_MS since startup, grouped by query shape (the command with literal values "
+        "stripped) and ordered by total time. Shapes that were explained carry the winning plan's stages; COLLSCAN and "
+        "in-memory SORT are listed under `problems` and also logged as warnings."
+    ),
+    summary="Slowest Mongo query shapes",
+    tags=["Admin"],
+    response_model=SlowQueries,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Slow query shapes fetched successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Slow query shapes fetched successfully",
+                        "data": {
+                            "thresholdMs": 100.0,
+                            "sampleRate": 0.1,
+                            "shapes": [
+                                {"command": "find", "collection": "statistics", "shape": {"filter": {"type": 1, "userId": 1}}, "count": 17, "totalMs": 2630.0, "maxMs": 212.7, "lastMs": 198.5, "lastSeen": "2025-07-20T09:14:03Z", "plan": ["COLLSCAN"], "problems": ["COLLSCAN"]}
+                            ]
+                        }
+                    }
+                }
+            }
+        }
+    },
+    name="slowQueries",
+)
+async def slow_queries(limit: int = Query(20, ge=1, le=200, description="Maximum number of shapes")):
+    return {
+        "message": "Slow query shapes fetched successfully",
+        "data": {
+            "thresholdMs": app.slow_queries.threshold_ms,
+            "sampleRate": app.slow_queries.sample,
+            "shapes": app.slow_queries.snapshot(limit),
+        },
+    }
+
+@app.get(
+    "/metrics",
+    description=(
+        "Prometheus metrics in the text exposition format: request latency per route, Mongo command latency "
+        "and event loop lag, all as histograms since startup."
+    ),
+    summary="Prometheus metrics",
+    tags=["Admin"],
+    response_class=Response,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Metrics in Prometheus text format",
+            "content": {
+                "text/plain": {
+                    "example": (
+                        "# HELP http_request_duration_seconds Time until the response headers are ready.\n"
+                        "# TYPE http_request_duration_seconds histogram\n"
+                        "http_request_duration_seconds_bucket{method=\"GET\",route=\"/goals/user/{userId}\",status=\"200\",le=\"0.01\"} 87\n"
+                    )
+                }
+            }
+        }
+    },
+    name="metrics",
+)
+async def metrics():
+    return Response(app.metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 # ----- Helpers -----
 
 @app.exception_handler(RequestValidationError)
@@ -985,24 +1184,39 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         },
     )
 
-def _to_out(d: dict) -> GoalOut:
-    return GoalOut(
-        id=str(d.get("_id")),                       
-        userId=d["userId"],                        
-        year=d["year"],                              
-        targetBooks=d["targetBooks"],                
-        books=[BookRef(**b) for b in d.get("books", [])],
-        completedBooks=d.get("completedBooks", 0),   
-        createdAt=d["createdAt"],                    
-    )
+def _utcnow() -> datetime:
+    # naive UTC truncated to milliseconds, exactly what a later read from Mongo returns
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
 
-def _rb_to_out(d: dict) -> ReadBookOut:
-    return ReadBookOut(
-        id=str(d.get("_id")),
-        userId=d["userId"],
-        book=BookRef(**d["book"]),
-        fromGoalId=str(d["fromGoalId"]) if d.get("fromGoalId") else None,
-        createdAt=d["createdAt"],
-    )
+# plain dicts in the shape of GoalOut / ReadBookOut, see serialization.respond
+
+def _book_ref(b: dict) -> dict:
+    return {
+        "bookId": b["bookId"],
+        "finishedAt": b.get("finishedAt"),
+        "genre": b.get("genre"),
+        "pages": b.get("pages"),
+    }
+
+def _to_out(d: dict) -> dict:
+    return {
+        "id": str(d.get("_id")),
+        "userId": d["userId"],
+        "year": d["year"],
+        "targetBooks": d["targetBooks"],
+        "books": [_book_ref(b) for b in d.get("books", [])],
+        "completedBooks": d.get("completedBooks", 0),
+        "createdAt": d["createdAt"],
+    }
+
+def _rb_to_out(d: dict) -> dict:
+    return {
+        "id": str(d.get("_id")),
+        "userId": d["userId"],
+        "book": _book_ref(d["book"]),
+        "fromGoalId": str(d["fromGoalId"]) if d.get("fromGoalId") else None,
+        "createdAt": d["createdAt"],
+    }
 
 # SWAGGER: uvicorn app.main:app --reload --port 3004
\ No newline at end of file
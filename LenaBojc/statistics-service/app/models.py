@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal
 from datetime import datetime
 
 # ----- IN -----
@@ -17,7 +17,7 @@ class GoalTargetIn(BaseModel):
     targetBooks: int = Field(..., ge=1, example=12)
 
 class GoalAddBookIn(BaseModel):
-    # userId: str = Field(..., min_length=1, example="u1")
+    userId: str = Field(..., min_length=1, example="u1", description="The goal must belong to this user")
     book: BookRef = Field(..., description="Book to add to the goal")
 
 class GoalRemoveBookIn(BaseModel):
@@ -66,4 +66,48 @@ class ReadBookCreated(BaseModel):
 class GoalCreatedWithCoach(BaseModel):
     message: str
     data: GoalOut
-    coach: Optional[GoalHintsOut] = None
\ No newline at end of file
+    coach: Optional[GoalHintsOut] = None
+
+class IndexReport(BaseModel):
+    status: str
+    missing: List[str] = []
+    mismatched: List[Dict[str, Any]] = []
+    extra: List[str] = []
+    created: List[str] = []
+    errors: Dict[str, str] = {}
+    error: Optional[str] = None
+
+class IndexReportOut(BaseModel):
+    message: str
+    data: IndexReport
+
+class RouteRoundTrips(BaseModel):
+    requests: int
+    roundTrips: int
+    max: int
+    avg: float
+
+class RoundTripStatsOut(BaseModel):
+    message: str
+    data: Dict[str, RouteRoundTrips]
+
+class SlowQueryShape(BaseModel):
+    command: str
+    collection: Optional[str] = None
+    shape: Dict[str, Any]
+    count: int
+    totalMs: float
+    maxMs: float
+    lastMs: float
+    lastSeen: datetime
+    plan: Optional[List[str]] = None
+    problems: List[str] = []
+
+class SlowQueriesData(BaseModel):
+    thresholdMs: float
+    sampleRate: float
+    shapes: List[SlowQueryShape]
+
+class SlowQueries(BaseModel):
+    message: str
+    data: SlowQueriesData
@@ -0,0 +1,17 @@
+import os
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+# Fast path for goal responses: documents are shaped into plain dicts and encoded
+# once by pydantic-core. Routes keep their response_model, so the OpenAPI schema
+# does not change; FastAPI just does not validate a Response it is handed.
+# FAST_SERIALIZATION=0 returns the dicts instead and lets FastAPI validate them.
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "1") != "0"
+
+
+def respond(content: dict, status_code: int = 200):
+    """`status_code` must match the route's own, which applies when the dict is returned."""
+    if not FAST_SERIALIZATION:
+        return content
+    return Response(to_json(content), status_code, media_type="application/json")
@@ -1,8 +1,12 @@
 import os
-from fastapi import FastAPI
+import asyncio
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from strawberry.fastapi import GraphQLRouter
 from dotenv import load_dotenv
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
 from .schema import schema
 
 load_dotenv()
@@ -21,4 +25,30 @@ app.add_middleware(
 )
 
 graphql_app = GraphQLRouter(schema)
-app.include_router(graphql_app, prefix="/graphql")
\ No newline at end of file
+app.include_router(graphql_app, prefix="/graphql")
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.requests.observe(
+        time.perf_counter() - started,
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code),
+    )
+    return response
+
+@app.on_event("startup")
+async def startup():
+    app.loop_lag_task = asyncio.create_task(metrics.watch_loop_lag())
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.loop_lag_task.cancel()
+
+# Prometheus metriki: latenca po poteh, klici na reviews/stats/books, zamik event loopa
+@app.get("/metrics", response_class=Response, include_in_schema=False)
+async def metrics_endpoint():
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
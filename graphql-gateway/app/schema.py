@@ -2,12 +2,19 @@ import os, httpx, strawberry
 from typing import Optional, List
 from datetime import datetime
 import asyncio
+from .metrics import metrics
 
 # Osnovni URL-ji (iz .env) z varnimi defaulti
 REVIEWS_URL = os.getenv("REVIEWS_URL", "http://backend-reviews:3002")
 STATS_URL   = os.getenv("STATS_URL",   "http://backend-statistics:3004")
 BOOKS_URL = os.getenv("BOOKS_URL", "http://backend-books:3032")
 
+# merjenje odzivnih časov po storitvah, glej GET /metrics
+HTTP_HOOKS = metrics.http_hooks({REVIEWS_URL: "reviews", STATS_URL: "stats", BOOKS_URL: "books"})
+
+# največja stran, ki jo vrne review-service (limit na seznamih in /discussion)
+PAGE_SIZE = 100
+
 def _to_dt(s: Optional[str]) -> Optional[datetime]:
     if s is None:
         return None
@@ -25,6 +32,19 @@ def _data(payload):
         return payload["data"]
     return payload
 
+async def _remaining_pages(c: httpx.AsyncClient, url: str, page: dict) -> list:
+    """Elementi strani `page` ({items, nextCursor}) in vseh naslednjih, dokler je nextCursor."""
+    items = list(page.get("items") or [])
+    cursor = page.get("nextCursor")
+    while cursor:
+        r = await c.get(url, params={"limit": PAGE_SIZE, "after": cursor})
+        # nepopoln seznam ni tih: napaka gre v GraphQL "errors"
+        r.raise_for_status()
+        d = _data(r.json()) or {}
+        items += d.get("items") or []
+        cursor = d.get("nextCursor")
+    return items
+
 async def _fetch_book_detail(c: httpx.AsyncClient, book_id: str) -> dict:
     # GET /books/{bookId} iz books-service
     r = await c.get(f"{BOOKS_URL}/books/{book_id}")
@@ -32,6 +52,15 @@ async def _fetch_book_detail(c: httpx.AsyncClient, book_id: str) -> dict:
         return {}
     return r.json()
 
+async def _fetch_averages(c: httpx.AsyncClient, book_ids: List[str]) -> dict:
+    # POST /reviews/averages iz review-service: vsa povprečja v enem klicu
+    if not book_ids:
+        return {}
+    r = await c.post(f"{REVIEWS_URL}/reviews/averages", json={"bookIds": book_ids})
+    if r.status_code != 200:
+        return {}
+    return (_data(r.json()) or {}).get("items", {})
+
 @strawberry.type
 class Coach:
     status: Optional[str] = None
@@ -72,6 +101,12 @@ class Comment:
     comment: str
     createdAt: datetime
 
+def _to_comment(d: dict) -> Comment:
+    return Comment(
+        id=d["id"], userId=d["userId"], bookId=d["bookId"],
+        comment=d["comment"], createdAt=_to_dt(d["createdAt"])
+    )
+
 @strawberry.type
 class Review:
     id: str
@@ -80,23 +115,21 @@ class Review:
     rating: int
     review: Optional[str]
     createdAt: datetime
+    # komentarji, ki jih je reviews_by_book že dobil iz /discussion
+    prefetched_comments: strawberry.Private[Optional[List[Comment]]] = None
 
     # Relacija: vsi komentarji za isto knjigo
     @strawberry.field
     async def comments(self) -> List[Comment]:
+        if self.prefetched_comments is not None:
+            return self.prefetched_comments
         url = f"{REVIEWS_URL}/books/{self.bookId}/comments"
-        async with httpx.AsyncClient(timeout=5.0) as c:
-            r = await c.get(url)
-        if r.status_code != 200:
-            return []
-        items = _items(r.json())
-        return [
-            Comment(
-                id=d["id"], userId=d["userId"], bookId=d["bookId"],
-                comment=d["comment"], createdAt=_to_dt(d["createdAt"])
-            )
-            for d in items
-        ]
+        async with httpx.AsyncClient(timeout=5.0, event_hooks=HTTP_HOOKS) as c:
+            r = await c.get(url, params={"limit": PAGE_SIZE})
+            if r.status_code != 200:
+                return []
+            items = await _remaining_pages(c, url, _data(r.json()) or {})
+        return [_to_comment(d) for d in items]
 
 @strawberry.type
 class Goal:
@@ -115,17 +148,26 @@ class AverageScore:
 class Query:
     @strawberry.field
     async def reviews_by_book(self, bookId: str) -> List[Review]:
-        url = f"{REVIEWS_URL}/books/{bookId}/reviews"
-        async with httpx.AsyncClient(timeout=5.0) as c:
-            r = await c.get(url)
-        if r.status_code != 200:
-            return []
-        items = _items(r.json())
+        # GET /books/{bookId}/discussion: prvi strani recenzij in komentarjev knjige v enem klicu,
+        # zato Review.comments ne kliče review-service še enkrat za vsako recenzijo;
+        # preostale strani (nextCursor) preberemo z /reviews in /comments, vzporedno
+        url = f"{REVIEWS_URL}/books/{bookId}/discussion"
+        async with httpx.AsyncClient(timeout=5.0, event_hooks=HTTP_HOOKS) as c:
+            r = await c.get(url, params={"limit": PAGE_SIZE})
+            if r.status_code != 200:
+                return []
+            d = _data(r.json()) or {}
+            items, comment_items = await asyncio.gather(
+                _remaining_pages(c, f"{REVIEWS_URL}/books/{bookId}/reviews", d.get("reviews") or {}),
+                _remaining_pages(c, f"{REVIEWS_URL}/books/{bookId}/comments", d.get("comments") or {}),
+            )
+        comments = [_to_comment(x) for x in comment_items]
         return [
             Review(
                 id=i["id"], userId=i["userId"], bookId=i["bookId"],
                 rating=i["rating"], review=i.get("review"),
-                createdAt=_to_dt(i["createdAt"])
+                createdAt=_to_dt(i["createdAt"]),
+                prefetched_comments=comments,
             )
             for i in items
         ]
@@ -133,7 +175,7 @@ class Query:
     @strawberry.field
     async def average_rating(self, bookId: str) -> Optional[AverageScore]:
         url = f"{REVIEWS_URL}/reviews/{bookId}/average"
-        async with httpx.AsyncClient(timeout=5.0) as c:
+        async with httpx.AsyncClient(timeout=5.0, event_hooks=HTTP_HOOKS) as c:
             r = await c.get(url)
         if r.status_code != 200:
             return None
@@ -144,7 +186,7 @@ class Query:
     @strawberry.field
     async def goal_by_user(self, userId: str) -> Optional[Goal]:
         url = f"{STATS_URL}/goals/user/{userId}"
-        async with httpx.AsyncClient(timeout=5.0) as c:
+        async with httpx.AsyncClient(timeout=5.0, event_hooks=HTTP_HOOKS) as c:
             r = await c.get(url)
         if r.status_code != 200:
             return None
@@ -158,7 +200,7 @@ class Query:
     @strawberry.field
     async def goal_with_books(self, userId: str) -> Optional[GoalWithBooks]:
         # 1) preberi goal
-        async with httpx.AsyncClient(timeout=6.0) as c:
+        async with httpx.AsyncClient(timeout=6.0, event_hooks=HTTP_HOOKS) as c:
             r = await c.get(f"{STATS_URL}/goals/user/{userId}")
             if r.status_code != 200:
                 return None
@@ -168,10 +210,14 @@ class Query:
             if not d:
                 return None
 
-            # 2) paralelno preberi podrobnosti za vsako knjigo
+            # 2) paralelno preberi podrobnosti za vsako knjigo in povprečne ocene
             books_in_goal = d.get("books", []) or []
             tasks = [_fetch_book_detail(c, b["bookId"]) for b in books_in_goal]
-            details = await asyncio.gather(*tasks, return_exceptions=True)
+            averages, *details = await asyncio.gather(
+                _fetch_averages(c, [b["bookId"] for b in books_in_goal]), *tasks, return_exceptions=True
+            )
+            if not isinstance(averages, dict):
+                averages = {}
 
         # 3) zgradi obogatene knjige
         enriched: List[BookInGoal] = []
@@ -186,7 +232,7 @@ class Query:
                     title=info.get("title"),
                     author=info.get("author"),
                     coverUrl=info.get("coverUrl"),
-                    averageRating=info.get("averageRating"),
+                    averageRating=(averages.get(base["bookId"]) or {}).get("average", info.get("averageRating")),
                 )
             )
 